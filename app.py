@@ -1,13 +1,7 @@
 import streamlit as st
-import pandas as pd
-import csv
-import io
-from scraper import scrape_clinic_site
-from preprocessor import preprocess_data
-from seo_optimizer import generate_seo_proposals
-import re
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
+import time
+from jobs import ACTIVE_STATUSES
+from exporter import export, extract_clinic_name
 
 # パスワード認証機能を追加
 def check_password():
@@ -38,6 +32,21 @@ def check_password():
         # Password correct.
         return True
 
+JOB_POLL_INTERVAL = 0.5  # ジョブの進捗を確認する間隔（秒）
+
+# スクリプトの再実行やセッションをまたいで、1プロセスに1つだけ作る。
+# 分析の処理（スクレイパー・OpenAIのクライアント等）は初めて分析するときに読み込み、パスワード入力画面を早く表示する
+@st.cache_resource
+def get_page_store():
+    # 前回のクロール結果と提案を保存しておき、変更のないページは再利用する
+    from page_store import PageStore
+    return PageStore()
+
+@st.cache_resource
+def get_job_manager():
+    from jobs import JobManager
+    return JobManager(page_store=get_page_store())
+
 def main():
     st.title("クリニックSEO最適化支援ツール")
     st.markdown("✨更新情報  \n▼ver1.0.0  \nツール作成しました。")
@@ -58,131 +67,129 @@ def main():
 
     if st.button("分析開始"):
         if clinic_url and seo_goal:
-            try:
-                # 進捗バーの初期化
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-
-                # スクレイピング
-                scraped_data = scrape_clinic_site(clinic_url, lambda p, m: update_progress(progress_bar, status_text, p, m))
-                
-                # クリニック名の抽出
-                st.session_state.clinic_name = extract_clinic_name(scraped_data)
-                
-                # データ前処理
-                update_progress(progress_bar, status_text, 0.7, "データ前処理中...")
-                processed_data = preprocess_data(scraped_data)
-                
-                # SEO最適化提案生成
-                update_progress(progress_bar, status_text, 0.8, "SEO最適化提案生成中(GPT-4o-mini)...")
-                st.session_state.seo_proposals = generate_seo_proposals(processed_data, seo_goal)
-                
-                # 分析完了フラグを設定
-                st.session_state.analysis_complete = True
-                
-                # 結果表示
-                update_progress(progress_bar, status_text, 1.0, "完了")
-
-            except Exception as e:
-                st.error(f"エラーが発生しました: {str(e)}")
+            # 分析はバックグラウンドで実行し、画面は進捗を表示するだけにする
+            # （同じURL・SEO目標の分析が実行中なら、そのジョブの進捗を表示する）
+            st.session_state.job_id = get_job_manager().submit(clinic_url, seo_goal)
+            st.session_state.analysis_complete = False
         else:
             st.error("URLとSEO目標を入力してください。")
 
+    if st.session_state.get('job_id'):
+        job_manager = get_job_manager()
+        job_id = st.session_state.job_id
+        if st.button("キャンセル"):
+            job_manager.cancel(job_id)
+
+        # 進捗バーの初期化
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+
+        # 提案ができたページから順に表示する（完了後はクロール順の一覧に置き換える）
+        live_results = st.empty()
+        live_container = live_results.container()
+        live_container.subheader("SEO最適化提案")
+
+        job = wait_for_job(job_manager, job_id, progress_bar, status_text, live_container)
+        st.session_state.job_id = None
+        live_results.empty()
+
+        if job['status'] == 'done':
+            result = job['result']
+            st.session_state.seo_proposals = {page: result['proposals'][page] for page in result['pages']}
+
+            # クリニック名の抽出
+            st.session_state.clinic_name = extract_clinic_name({page: {'title': title} for page, title in result['titles'].items()})
+            st.session_state.cache_stats = cache_stats(result['telemetry_summary'])
+            st.session_state.telemetry_summary = result['telemetry_summary']
+            st.session_state.telemetry_totals = result['telemetry_totals']
+
+            # 分析完了フラグを設定
+            st.session_state.analysis_complete = True
+
+            # 結果表示
+            update_progress(progress_bar, status_text, 1.0, "完了")
+        elif job['status'] == 'cancelled':
+            st.warning("分析をキャンセルしました。")
+        else:
+            st.error(f"エラーが発生しました: {job['error']}")
+
     # 結果の表示（セッションステートを使用）
     if st.session_state.analysis_complete:
+        if 'cache_stats' in st.session_state:
+            stats = st.session_state.cache_stats
+            st.caption(f"APIキャッシュ: ヒット {stats['hits']}件 / ミス {stats['misses']}件")
+        if 'telemetry_summary' in st.session_state:
+            display_telemetry(st.session_state.telemetry_summary, st.session_state.telemetry_totals)
         display_results(st.session_state.seo_proposals)
 
         # Excelファイルダウンロードボタンの追加
-        excel = convert_to_excel(st.session_state.seo_proposals)
-        file_name = f"{st.session_state.clinic_name}_SEO最適化案.xlsx"
+        file_name = f"{st.session_state.clinic_name}_SEO最適化案"
         st.download_button(
             label="結果をExcelでダウンロード",
-            data=excel,
-            file_name=file_name,
+            data=export(st.session_state.seo_proposals, 'xlsx'),
+            file_name=f"{file_name}.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
+        st.download_button(
+            label="結果をCSVでダウンロード",
+            data=export(st.session_state.seo_proposals, 'csv'),
+            file_name=f"{file_name}.csv",
+            mime="text/csv",
+        )
 
 def update_progress(progress_bar, status_text, progress, message):
     progress_bar.progress(progress)
     status_text.text(message)
 
+def wait_for_job(job_manager, job_id, progress_bar, status_text, live_container):
+    # ジョブが終わるまで進捗と途中結果を表示する（ブラウザの再読み込み後も続きから表示できる）
+    shown = set()
+    while True:
+        job = job_manager.get(job_id)
+        update_progress(progress_bar, status_text, min(job['progress'], 1.0), job['message'] or "")
+        for page, proposals in ((job['result'] or {}).get('proposals') or {}).items():
+            if page not in shown:
+                shown.add(page)
+                with live_container:
+                    display_page_result(page, proposals)
+        if job['status'] not in ACTIVE_STATUSES:
+            return job
+        time.sleep(JOB_POLL_INTERVAL)
+
+def cache_stats(summary):
+    counts = {row['stage']: row['count'] for row in summary}
+    return {'hits': counts.get('llm_cache_hit', 0), 'misses': counts.get('llm_cache_miss', 0)}
+
+def display_telemetry(summary, totals):
+    # 処理ごとの所要時間・トークン数・概算料金
+    with st.expander("実行の計測結果"):
+        st.write(
+            f"トークン数: 入力 {totals['prompt_tokens']} / 出力 {totals['completion_tokens']}  "
+            f"概算料金: ${totals['cost_usd']:.4f}  取得データ量: {totals['bytes'] / 1024:.0f} KB"
+        )
+        st.table(summary)
+
 def display_results(seo_proposals):
     st.subheader("SEO最適化提案")
     for page, proposals in seo_proposals.items():
-        with st.expander(f"ページ: {page}"):
-            st.markdown("### 現在の情報:", unsafe_allow_html=True)
-            st.write(f"タイトル: {proposals['current_title']} (文字数: {len(proposals['current_title'])})")
-            st.write(f"ディスクリプション: {proposals['current_description']} (文字数: {len(proposals['current_description'])})")
-            
-            st.markdown("### 最適化提案:", unsafe_allow_html=True)
-            for i, title in enumerate(proposals['proposed_titles'], 1):
-                st.write(f"タイトル案 {i}: {title} (文字数: {len(title)})")
-            for i, desc in enumerate(proposals['proposed_descriptions'], 1):
-                st.write(f"ディスクリプション案 {i}: {desc} (文字数: {len(desc)})")
+        display_page_result(page, proposals)
 
-def convert_to_excel(seo_proposals):
-    wb = Workbook()
-    ws = wb.active
-    row_num = 1
-
-    for page, proposals in seo_proposals.items():
-        ws.cell(row=row_num, column=1, value='ページURL')
-        ws.cell(row=row_num, column=2, value=page)
-        ws.cell(row=row_num, column=3, value='文字数')
-        row_num += 1
-
-        ws.cell(row=row_num, column=1, value='現在のタイトル')
-        ws.cell(row=row_num, column=2, value=proposals.get('current_title', ''))
-        ws.cell(row=row_num, column=3, value=f'=LEN(B{row_num})')
-        row_num += 1
-        
-        for i, title in enumerate(proposals.get('proposed_titles', []), 1):
-            ws.cell(row=row_num, column=1, value=f'タイトル案{i}')
-            ws.cell(row=row_num, column=2, value=title)
-            ws.cell(row=row_num, column=3, value=f'=LEN(B{row_num})')
-            row_num += 1
+def display_page_result(page, proposals):
+    with st.expander(f"ページ: {page}"):
+        st.markdown("### 現在の情報:", unsafe_allow_html=True)
+        st.write(f"タイトル: {proposals['current_title']} (文字数: {len(proposals['current_title'])})")
+        st.write(f"ディスクリプション: {proposals['current_description']} (文字数: {len(proposals['current_description'])})")
         
-        ws.cell(row=row_num, column=1, value='現在のディスクリプション')
-        ws.cell(row=row_num, column=2, value=proposals.get('current_description', ''))
-        ws.cell(row=row_num, column=3, value=f'=LEN(B{row_num})')
-        row_num += 1
-        
-        for i, desc in enumerate(proposals.get('proposed_descriptions', []), 1):
-            ws.cell(row=row_num, column=1, value=f'ディスクリプション案{i}')
-            ws.cell(row=row_num, column=2, value=desc)
-            ws.cell(row=row_num, column=3, value=f'=LEN(B{row_num})')
-            row_num += 1
-        
-        row_num += 1  # 空行を挿入
-
-    # 列幅の自動調整
-    for column in ws.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column)
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(cell.value)
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column_letter].width = adjusted_width
-
-    excel_file = io.BytesIO()
-    wb.save(excel_file)
-    excel_file.seek(0)
-    return excel_file.getvalue()
-
-def extract_clinic_name(scraped_data):
-    # トップページのタイトルからクリニック名を抽出
-    for url, data in scraped_data.items():
-        if url.endswith('/') or url.endswith('/index.html'):
-            title = data['title']
-            # クリニック名を抽出する正規表現パターン
-            match = re.search(r'(.+?)(クリニック|病院|医院)', title)
-            if match:
-                return match.group(0)
-    return "クリニック"  # デフォルト名
+        st.markdown("### 最適化提案:", unsafe_allow_html=True)
+        if proposals.get('duplicate_of'):
+            st.caption(f"ほぼ同じ内容のページ（{proposals['duplicate_of']}）の提案を流用しています")
+        for i, title in enumerate(proposals['proposed_titles'], 1):
+            st.write(f"タイトル案 {i}: {title} (文字数: {len(title)})")
+        for i, desc in enumerate(proposals['proposed_descriptions'], 1):
+            st.write(f"ディスクリプション案 {i}: {desc} (文字数: {len(desc)})")
+
+def convert_to_excel(seo_proposals):
+    return export(seo_proposals, 'xlsx').getvalue()
 
 if __name__ == "__main__":
     if check_password():
@@ -0,0 +1,178 @@
+import argparse
+import csv
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from exporter import EXPORTERS, extract_clinic_name, open_exporter
+from page_store import PageStore
+from pipeline import stream_site
+from scraper import DEFAULT_MAX_PAGES
+from seo_optimizer import DEFAULT_BATCH_SIZE
+from telemetry import RunTelemetry, configure_json_logging
+
+CHECKPOINT_FILE = "checkpoint.jsonl"
+
+def read_targets(path, default_goal=''):
+    # CSV/XLSXから url と seo_goal の列を読み込む
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True)
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else '' for h in next(rows, [])]
+        records = [dict(zip(header, row)) for row in rows]
+        wb.close()
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            records = list(csv.DictReader(f))
+
+    targets = []
+    for record in records:
+        url = str(record.get('url') or '').strip()
+        if not url:
+            continue
+        seo_goal = str(record.get('seo_goal') or default_goal).strip()
+        targets.append((url, seo_goal))
+    return targets
+
+def load_checkpoint(output_dir):
+    # 完了済みのサイトを (url, seo_goal) をキーにして読み込む
+    done = {}
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    done[(record['url'], record['seo_goal'])] = record
+    return done
+
+def append_checkpoint(output_dir, record):
+    with open(os.path.join(output_dir, CHECKPOINT_FILE), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+def safe_filename(name):
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', name)
+
+def run_site(index, url, seo_goal, output_dir, write_per_site=True, max_pages=DEFAULT_MAX_PAGES, batch_size=DEFAULT_BATCH_SIZE, write_metrics=False, format='xlsx'):
+    # 1サイト分の処理（プロセスプールからも呼べるようにトップレベルに定義）
+    def log(progress, message):
+        print(f"[{index}] {progress:.0%} {message}")
+
+    # 提案ができたページから順にファイルへ書き出す。
+    # クリニック名はクロールが進むまで分からないので、仮の名前で書いて最後に名前を変える
+    partial_path = os.path.join(output_dir, f"{index:04d}_partial.{format}")
+    exporter = open_exporter(partial_path, format) if write_per_site else None
+
+    telemetry = RunTelemetry(run_id=url)
+    scraped_data = {}
+    seo_proposals = {}
+    try:
+        for kind, page, value in stream_site(url, seo_goal, log, page_store=PageStore(), max_pages=max_pages, batch_size=batch_size, telemetry=telemetry):
+            if kind == 'page':
+                scraped_data[page] = value
+            else:
+                seo_proposals[page] = value
+                if exporter:
+                    exporter.add(page, value)
+        if not scraped_data:
+            # 接続できない等で1ページも取得できなかったサイトは失敗として扱い、チェックポイントに残さず次回に再実行する
+            raise RuntimeError("ページを1件も取得できませんでした（サイトに接続できない、または対象のページがありません）")
+    except Exception:
+        if exporter:
+            exporter.close()
+            os.remove(partial_path)
+        raise
+    seo_proposals = {page: seo_proposals[page] for page in scraped_data}
+    clinic_name = extract_clinic_name(scraped_data)
+
+    if write_metrics:
+        # Prometheusのテキスト形式で出力（textfile collector 等で取り込む）
+        metrics_dir = os.path.join(output_dir, "metrics")
+        os.makedirs(metrics_dir, exist_ok=True)
+        with open(os.path.join(metrics_dir, f"{index:04d}.prom"), 'w', encoding='utf-8') as f:
+            f.write(telemetry.to_prometheus())
+
+    file_name = None
+    if exporter:
+        # Excelはクロール順に並べて書き出す（CSV/Parquetは書き込み済み）
+        exporter.close(order=list(scraped_data))
+        file_name = f"{index:04d}_{safe_filename(clinic_name)}_SEO最適化案.{format}"
+        os.replace(partial_path, os.path.join(output_dir, file_name))
+
+    return {
+        'url': url,
+        'seo_goal': seo_goal,
+        'clinic_name': clinic_name,
+        'file': file_name,
+        'telemetry': telemetry.totals(),
+        'proposals': seo_proposals,
+    }
+
+def write_combined(output_dir, records, format='xlsx'):
+    combined = {}
+    for record in records:
+        combined.update(record['proposals'])
+    path = os.path.join(output_dir, f"combined_SEO最適化案.{format}")
+    exporter = open_exporter(path, format)
+    for page, proposals in combined.items():
+        exporter.add(page, proposals)
+    exporter.close()
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="複数のクリニックサイトをまとめてSEO分析する")
+    parser.add_argument("input", help="url, seo_goal 列を持つCSVまたはXLSXファイル")
+    parser.add_argument("-o", "--output-dir", default="batch_output", help="結果のファイルとチェックポイントの出力先")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="同時に処理するサイト数")
+    parser.add_argument("--processes", action="store_true", help="スレッドではなくプロセスで並列処理する（レート制限はプロセスごと）")
+    parser.add_argument("--goal", default="", help="seo_goal 列が空の行に使うSEO目標")
+    parser.add_argument("--max-pages", type=int, default=DEFAULT_MAX_PAGES, help="1サイトあたりの最大ページ数")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="1回のAPIリクエストにまとめるページ数（1で1ページずつ生成）")
+    parser.add_argument("--combined", action="store_true", help="全サイトを1つのファイルにまとめて出力する")
+    parser.add_argument("--format", choices=list(EXPORTERS), default="xlsx", help="出力形式（parquetはpyarrowが必要）")
+    parser.add_argument("--telemetry-log", help="計測イベントを1行1JSONで書き出すファイル（-で標準エラー出力）")
+    parser.add_argument("--metrics", action="store_true", help="サイトごとの計測結果をPrometheusのテキスト形式で metrics/ に出力する")
+    args = parser.parse_args(argv)
+
+    if args.telemetry_log:
+        configure_json_logging(args.telemetry_log)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    targets = read_targets(args.input, args.goal)
+    done = load_checkpoint(args.output_dir)
+    pending = [(i, url, goal) for i, (url, goal) in enumerate(targets, 1) if (url, goal) not in done]
+    print(f"対象 {len(targets)}件 / 完了済み {len(targets) - len(pending)}件 / 未処理 {len(pending)}件")
+
+    executor_class = ProcessPoolExecutor if args.processes else ThreadPoolExecutor
+    failed = 0
+    with executor_class(max_workers=max(1, args.workers)) as executor:
+        futures = {
+            executor.submit(run_site, i, url, goal, args.output_dir, not args.combined, args.max_pages, args.batch_size, args.metrics, args.format): (url, goal)
+            for i, url, goal in pending
+        }
+        for future in as_completed(futures):
+            url, goal = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"エラー: {url} の処理に失敗しました - {str(e)}")
+                continue
+            # 完了したサイトはすぐにチェックポイントへ書き込む（途中で落ちても再実行で続きから）
+            append_checkpoint(args.output_dir, record)
+            done[(url, goal)] = record
+            totals = record['telemetry']
+            print(f"完了: {url} -> {record['file'] or '(まとめて出力)'} (トークン {totals['prompt_tokens']}+{totals['completion_tokens']}, ${totals['cost_usd']:.4f})")
+
+    if args.combined:
+        records = [done[key] for key in targets if key in done]
+        print(f"まとめて出力: {write_combined(args.output_dir, records, args.format)}")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
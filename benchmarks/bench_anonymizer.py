@@ -0,0 +1,90 @@
+"""匿名化のベンチマーク（従来の2回置換 vs 1回走査のAnonymizer）
+
+合成した大きな日本語ページと、「先生」の後にかなが長く続くような
+意地悪な入力で、処理時間と出力の一致を確認する。
+
+    python benchmarks/bench_anonymizer.py [--repeat N]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from compactor import CONTENT_TOKEN_BUDGET, truncate_to_tokens
+from preprocessor import Anonymizer
+
+def legacy_anonymize(content):
+    # 変更前の anonymize_content（比較用）
+    content = re.sub(r'(理事長|院長|医師|先生|Dr\.?)\s*[\u3000-\u303f\u3040-\u309f\u30a0-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff66-\uff9f\s]{1,20}', '[医師名]', content, flags=re.IGNORECASE)
+    content = re.sub(r'経歴[:：].*?(?=\n|$)', '経歴: [匿名化された経歴]', content, flags=re.DOTALL)
+    return content
+
+def synthetic_page(rng, paragraphs=400):
+    lines = []
+    for _ in range(paragraphs):
+        lines.append(rng.choice([
+            '当院では内科・小児科の診療を行っています。お気軽にご相談ください。',
+            '院長 山田太郎 は地域医療に貢献してまいります。',
+            '経歴：東京大学医学部卒業、同大学附属病院勤務',
+            'Dr. Suzuki による診察のご案内',
+            '休診日：日曜・祝日　受付時間 9:00〜18:00',
+            '先生からのメッセージ　　みなさまの健康を支えます',
+        ]))
+    return '\n'.join(lines)
+
+def pathological_inputs(size):
+    return {
+        '先生+かなの連続': '先生' + 'あ' * size,
+        '先生の繰り返し': '先生' * (size // 2),
+        '先生+空白の連続': '先生' + ' ' * size + '!',
+        '経歴+改行なし': '経歴：' + '院長 やまだ ' * (size // 8),
+    }
+
+def measure(func, texts, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    anonymizer = Anonymizer()
+    rng = random.Random(0)
+    pages = [synthetic_page(rng) for _ in range(30)]
+
+    # パイプラインでは共通部分の除去とトークン数の調整が先に済んでいるので、匿名化はその範囲だけ
+    slices = [truncate_to_tokens(page, CONTENT_TOKEN_BUDGET) for page in pages]
+
+    mismatches = sum(1 for page in pages if legacy_anonymize(page) != anonymizer.anonymize(page))
+    legacy_time = measure(legacy_anonymize, pages, args.repeat)
+    full_time = measure(anonymizer.anonymize, pages, args.repeat)
+    sliced_time = measure(anonymizer.anonymize, slices, args.repeat)
+
+    average_size = sum(len(page) for page in pages) / len(pages)
+    average_slice = sum(len(text) for text in slices) / len(slices)
+    print(f"ページ数: {len(pages)} (平均 {average_size:.0f} 文字、プロンプト分 {average_slice:.0f} 文字)")
+    print(f"従来の2回置換（全文）:   {legacy_time / len(pages) * 1000:.3f} ms/ページ")
+    print(f"1回走査（全文）:        {full_time / len(pages) * 1000:.3f} ms/ページ")
+    print(f"1回走査（プロンプト分）: {sliced_time / len(pages) * 1000:.3f} ms/ページ")
+    print(f"出力の不一致: {mismatches}ページ")
+
+    # 入力の長さを倍にしたときに処理時間もおおよそ倍（線形）になることを確認
+    print("意地悪な入力（長さ n / 2n の処理時間）:")
+    small, large = pathological_inputs(50000), pathological_inputs(100000)
+    for name in small:
+        t1 = measure(anonymizer.anonymize, [small[name]], args.repeat)
+        t2 = measure(anonymizer.anonymize, [large[name]], args.repeat)
+        print(f"  {name}: {t1 * 1000:.2f} ms / {t2 * 1000:.2f} ms (比 {t2 / t1:.1f})")
+
+if __name__ == '__main__':
+    main()
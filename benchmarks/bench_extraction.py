@@ -0,0 +1,83 @@
+"""HTML抽出のベンチマーク（1回走査の抽出 vs BeautifulSoup）
+
+保存済みのHTMLがあるディレクトリを指定すると、その中の *.html を使う。
+指定しない場合は、テンプレートの多いクリニックページを合成して使う。
+
+    python benchmarks/bench_extraction.py [corpus_dir] [--repeat N]
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from html_extractor import extract_page
+from scraper import extract_html_with_soup
+
+DEPARTMENTS = ['内科', '小児科', '皮膚科', '眼科', '耳鼻咽喉科', '整形外科', '婦人科', '消化器内科']
+
+def synthetic_page(index, rng):
+    nav = ''.join(
+        f'<li class="nav-item"><a href="/{d}/"><span>{d}</span></a></li>' for d in DEPARTMENTS
+    ) * 6
+    body = ''.join(
+        f'<div class="section"><h2>{rng.choice(DEPARTMENTS)}について</h2>'
+        f'<p>当院では{rng.choice(DEPARTMENTS)}の診療を行っています。お気軽にご相談ください。&nbsp;詳しくは<a href="/page{rng.randint(0, 99)}/">こちら</a>。</p></div>'
+        for _ in range(120)
+    )
+    script = '<script>window.dataLayer = window.dataLayer || [];' + 'function f(){return 1;}' * 200 + '</script>'
+    return (
+        f'<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8">'
+        f'<title>{DEPARTMENTS[index % len(DEPARTMENTS)]}｜まめるクリニック</title>'
+        f'<meta name="description" content="まめるクリニックの{DEPARTMENTS[index % len(DEPARTMENTS)]}のページです。">'
+        f'<style>body{{margin:0}}</style>{script}</head><body>'
+        f'<header><nav><ul>{nav}</ul></nav></header><main>{body}</main>'
+        f'<footer><address>東京都渋谷区1-2-3</address><ul>{nav}</ul></footer></body></html>'
+    )
+
+def load_corpus(corpus_dir):
+    if corpus_dir:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(corpus_dir, '**', '*.html'), recursive=True)):
+            with open(path, encoding='utf-8', errors='replace') as f:
+                pages.append(f.read())
+        return pages
+    rng = random.Random(0)
+    return [synthetic_page(i, rng) for i in range(30)]
+
+def measure(func, pages, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for html in pages:
+            func(html)
+        best = min(best, time.perf_counter() - start)
+    return best / len(pages)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('corpus_dir', nargs='?', help='保存済みHTMLのディレクトリ')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus_dir)
+    if not pages:
+        raise SystemExit('HTMLファイルが見つかりません')
+
+    mismatches = sum(1 for html in pages if extract_page(html) != extract_html_with_soup(html))
+
+    soup_time = measure(extract_html_with_soup, pages, args.repeat)
+    stream_time = measure(extract_page, pages, args.repeat)
+    average_size = sum(len(html) for html in pages) / len(pages)
+
+    print(f"ページ数: {len(pages)} (平均 {average_size / 1024:.1f} KB)")
+    print(f"BeautifulSoup: {soup_time * 1000:.2f} ms/ページ")
+    print(f"1回走査の抽出: {stream_time * 1000:.2f} ms/ページ")
+    print(f"高速化: {soup_time / stream_time:.1f}倍")
+    print(f"抽出結果の不一致: {mismatches}ページ")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""起動時間（モジュールのimportにかかる時間）のベンチマーク
+
+画面（app.py）とバッチ・ジョブのワーカーの入口になるモジュールを、それぞれ新しいPythonプロセスでimportして計測する。
+APIキーを設定しない状態で計測し、importだけでAPIキーが必要にならないことも確認する。
+
+    python benchmarks/bench_import.py [--repeat N] [--top N] [module ...]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ENTRY_POINTS = ['app', 'batch', 'jobs', 'pipeline', 'seo_optimizer', 'exporter']
+
+def run_python(code, env, importtime=False):
+    # 新しいプロセスで実行し、(経過秒, 終了コード, 標準エラー) を返す
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT_DIR, env=env, capture_output=True, text=True)
+    return time.perf_counter() - start, result.returncode, result.stderr
+
+def slowest_imports(stderr, module, top):
+    # -X importtime の出力から、module が直接importしたモジュールを累積時間（子のimportを含む）の長い順に返す。
+    # 子のimportは親より先に、1段深いほど2文字ずつ字下げされて出力される
+    children = []
+    for line in stderr.splitlines():
+        parts = line.split('|')
+        if not line.startswith('import time:') or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        depth = (len(parts[2]) - len(parts[2].lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((int(parts[1]) / 1000, name))
+        elif depth == 0:
+            if name == module:
+                return sorted(children, reverse=True)[:top]
+            children = []
+    return []
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*', default=ENTRY_POINTS, help='計測するモジュール')
+    parser.add_argument('--repeat', type=int, default=5, help='モジュールごとの計測回数')
+    parser.add_argument('--top', type=int, default=5, help='時間のかかったimportを表示する数（0で表示しない）')
+    args = parser.parse_args()
+
+    env = dict(os.environ, SEO_CACHE_DIR=tempfile.mkdtemp(prefix='seo-bench-'))
+    env.pop('OPENAI_API_KEY', None)
+    env.pop('SEO_TELEMETRY_LOG', None)
+
+    # インタプリタの起動だけの時間を差し引く
+    baseline = min(run_python('pass', env)[0] for _ in range(args.repeat))
+    print(f"Pythonの起動: {baseline * 1000:.0f}ms（以下はこれを差し引いた時間）")
+
+    for module in args.modules:
+        # 1回目は .pyc の作成を含むので計測から除く
+        run_python(f'import {module}', env)
+        timings = []
+        for _ in range(args.repeat):
+            elapsed, returncode, stderr = run_python(f'import {module}', env)
+            if returncode:
+                break
+            timings.append(elapsed - baseline)
+        if returncode:
+            print(f"\n{module}: importできません\n  {stderr.strip().splitlines()[-1]}")
+            continue
+        print(f"\n{module}: 中央値 {statistics.median(timings) * 1000:.0f}ms / 最小 {min(timings) * 1000:.0f}ms")
+        if args.top:
+            _, _, stderr = run_python(f'import {module}', env, importtime=True)
+            for cumulative_ms, name in slowest_imports(stderr, module, args.top):
+                print(f"  {name:<24} {cumulative_ms:>7.1f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""スクレイピング→前処理→提案生成の全体のベンチマーク（ネットワーク接続・API料金なし）
+
+架空のクリニックサイト（fake_site.py）とOpenAI互換のモック（mock_llm.py）を起動し、
+pipeline.stream_site を実行して、ページ/秒・提案ができるまでの時間の分位点・1ページあたりのトークン数を出力する。
+
+    python benchmarks/bench_pipeline.py [--pages N] [--llm-latency 秒] [--rate-limit-ratio 0.1] [--runs N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import unquote, urlparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+import fake_site
+import mock_llm
+
+def percentiles(values):
+    from telemetry import percentile
+    ordered = sorted(values)
+    return ' / '.join(f"p{p} {percentile(ordered, p):.2f}s" for p in (50, 95, 99))
+
+def site_path(url):
+    return unquote(urlparse(url).path)
+
+def run_once(url, args, page_store, telemetry):
+    from pipeline import stream_site
+
+    start = time.perf_counter()
+    fetched_at = {}
+    duplicates = {}  # 提案を流用したページ -> 流用元のページ
+    time_to_result = []  # 開始から提案ができるまで
+    page_to_result = []  # ページを取得してから提案ができるまで
+    # スクレイパー等のprintを抑える（--verbose で表示）
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        for kind, page, value in stream_site(
+            url, args.goal, lambda progress, message: None, page_store=page_store, max_pages=args.max_pages,
+            batch_size=args.batch_size, max_concurrency=args.concurrency, telemetry=telemetry, dedup=not args.no_dedup,
+        ):
+            now = time.perf_counter()
+            if kind == 'page':
+                fetched_at[page] = now
+            else:
+                time_to_result.append(now - start)
+                page_to_result.append(now - fetched_at[page])
+                if value.get('duplicate_of'):
+                    duplicates[page] = value['duplicate_of']
+    return time.perf_counter() - start, time_to_result, page_to_result, duplicates
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=50, help='架空サイトのページ数')
+    parser.add_argument('--links', type=int, default=8)
+    parser.add_argument('--max-pages', type=int, default=30, help='クロールする最大ページ数')
+    parser.add_argument('--site-latency', type=float, default=0.05, help='サイトの応答時間（秒）')
+    parser.add_argument('--no-sitemap', action='store_true')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.0, help='同じテンプレートの本文のページの割合')
+    parser.add_argument('--no-dedup', action='store_true', help='ほぼ同じ内容のページの提案の流用をしない')
+    parser.add_argument('--footer-lines', type=int, default=60, help='全ページ共通のフッターの行数')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='APIの応答時間（秒）')
+    parser.add_argument('--llm-jitter', type=float, default=0.2)
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.0, help='APIが429を返す割合（0〜1）')
+    parser.add_argument('--retry-after', type=float, default=1.0)
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=5, help='同時に送信するAPIリクエスト数')
+    parser.add_argument('--runs', type=int, default=1, help='同じキャッシュで繰り返す回数（2回目以降はキャッシュ・保存済みの提案が効く）')
+    parser.add_argument('--cache-dir', help='キャッシュの保存先（省略時は一時ディレクトリ）')
+    parser.add_argument('--goal', default='地域名と診療科目で検索されたときに上位表示されたい')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    site = fake_site.FakeSite(args.pages, args.links, duplicate_ratio=args.duplicate_ratio, footer_lines=args.footer_lines)
+    site_server = fake_site.serve(site, latency=args.site_latency, sitemap=not args.no_sitemap)
+    stats = mock_llm.MockStats()
+    llm_server = mock_llm.serve(
+        latency=args.llm_latency, jitter=args.llm_jitter, rate_limit_ratio=args.rate_limit_ratio,
+        retry_after=args.retry_after, stats=stats,
+    )
+
+    # llm_cache はimport時に、seo_optimizer は最初のAPI呼び出し時に環境変数を読むので、importより前に設定する
+    os.environ['OPENAI_BASE_URL'] = f'http://127.0.0.1:{llm_server.server_port}/v1'
+    os.environ['OPENAI_API_KEY'] = 'benchmark'
+    os.environ['SEO_CACHE_DIR'] = args.cache_dir or tempfile.mkdtemp(prefix='seo-bench-')
+
+    from page_store import PageStore
+    from telemetry import RunTelemetry
+
+    url = f'http://127.0.0.1:{site_server.server_port}/'
+    page_store = PageStore()
+    print(f"サイト: {url} ({len(site.paths)}ページ、最大 {args.max_pages}ページをクロール)")
+    print(f"キャッシュ: {os.environ['SEO_CACHE_DIR']}")
+
+    for run in range(1, args.runs + 1):
+        telemetry = RunTelemetry(run_id=f'run{run}')
+        requests_before, rate_limited_before = stats.requests, stats.rate_limited
+        elapsed, time_to_result, page_to_result, duplicates = run_once(url, args, page_store, telemetry)
+
+        pages = len(time_to_result)
+        totals = telemetry.totals()
+        retries = sum(row['retries'] for row in telemetry.summary())
+        print(f"\n[{run}回目] {pages}ページ / {elapsed:.2f}s ({pages / elapsed:.2f} ページ/秒)")
+        if pages:
+            print(f"  開始から提案まで:   {percentiles(time_to_result)}")
+            print(f"  取得から提案まで:   {percentiles(page_to_result)}")
+            print(f"  トークン/ページ:    入力 {totals['prompt_tokens'] / pages:.0f} / 出力 {totals['completion_tokens'] / pages:.0f}"
+                  f"  (概算 ${totals['cost_usd'] / pages:.5f}/ページ)")
+        print(f"  APIリクエスト:      {stats.requests - requests_before}件 (429: {stats.rate_limited - rate_limited_before}件、再試行 {retries}回)")
+        # 流用元・流用先のどちらかがテンプレートのページでなければ、内容の違うページに提案を流用している
+        wrong = sum(1 for page, source in duplicates.items() if not {site_path(page), site_path(source)} <= site.template_paths)
+        print(f"  提案の流用:         {len(duplicates)}件 (誤り {wrong}件、テンプレートのページ {len(site.template_paths)}件)")
+        print("  処理ごとの時間:")
+        for row in telemetry.summary():
+            if row['total_ms']:
+                print(f"    {row['stage']:<16} {row['count']:>5}件  平均 {row['avg_ms']:>8.1f}ms  p95 {row['p95_ms']:>8.1f}ms")
+
+    site_server.shutdown()
+    llm_server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""再試行・遮断（resilience.RetryPolicy）の確認（ネットワーク接続なし）
+
+1. 429の集中: 同時に呼び出した全員が1回ずつ429を受け、再試行で成功する
+2. 5xxの障害: 一定時間すべて503を返し、その後に回復する（遮断中は送信を止め、回復後に全員が成功する）
+
+どちらも全ての呼び出しが成功しなければ終了コード1で終わる。
+
+    python benchmarks/bench_retry.py [--callers N] [--outage 秒]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from resilience import CircuitBreaker, PermanentError, RateLimitedError, RetryBudget, RetryPolicy, TransientError
+
+def make_policy(reset_timeout):
+    # 実際の待ち時間を短くした設定（判定の仕組みは本番と同じ）
+    return RetryPolicy(
+        lambda e: PermanentError(str(e)), base_delay=0.01, max_delay=0.1,
+        budget=RetryBudget(), breaker=CircuitBreaker(reset_timeout=reset_timeout),
+    )
+
+def run_callers(policy, callers, func):
+    # 同時に呼び出し、(成功数, 失敗した例外のリスト, 経過秒) を返す
+    barrier = threading.Barrier(callers)
+
+    def call(index):
+        barrier.wait()
+        return policy.call(lambda: func(index), key='host')
+
+    start = time.perf_counter()
+    errors = []
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        futures = [executor.submit(call, i) for i in range(callers)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(e)
+    return callers - len(errors), errors, time.perf_counter() - start
+
+def rate_limit_burst(callers):
+    policy = make_policy(reset_timeout=30.0)
+    limited = set()
+    lock = threading.Lock()
+
+    def func(index):
+        with lock:
+            first = index not in limited
+            limited.add(index)
+        if first:
+            raise RateLimitedError('429 Too Many Requests', 429, retry_after=0.05)
+        return 'ok'
+
+    succeeded, errors, elapsed = run_callers(policy, callers, func)
+    # 集中が終わった後の呼び出しも通ること
+    try:
+        after = policy.call(lambda: 'ok', key='host') == 'ok'
+    except Exception:
+        after = False
+    return succeeded, errors, elapsed, f"その後の呼び出し: {'成功' if after else '失敗'}", after
+
+def outage(callers, duration):
+    policy = make_policy(reset_timeout=duration / 3)
+    recovered_at = time.monotonic() + duration
+    sent = [0]
+    lock = threading.Lock()
+
+    def func(index):
+        with lock:
+            sent[0] += 1
+        if time.monotonic() < recovered_at:
+            raise TransientError('503 Service Unavailable', 503)
+        return 'ok'
+
+    succeeded, errors, elapsed = run_callers(policy, callers, func)
+    return succeeded, errors, elapsed, f"サーバーに届いたリクエスト: {sent[0]}件", True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--callers', type=int, default=6, help='同時に呼び出す数')
+    parser.add_argument('--outage', type=float, default=0.6, help='503を返し続ける秒数')
+    args = parser.parse_args()
+
+    ok = True
+    scenarios = [
+        ('429の集中', lambda: rate_limit_burst(args.callers)),
+        ('5xxの障害', lambda: outage(args.callers, args.outage)),
+    ]
+    for name, scenario in scenarios:
+        succeeded, errors, elapsed, note, passed = scenario()
+        passed = passed and not errors
+        ok = ok and passed
+        print(f"{name}: {succeeded}/{args.callers}件成功 ({elapsed:.2f}s) {note} {'OK' if passed else 'NG'}")
+        for error in errors:
+            print(f"  {type(error).__name__}: {error}")
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
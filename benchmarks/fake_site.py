@@ -0,0 +1,155 @@
+"""ベンチマーク用の架空のクリニックサイトを返すローカルHTTPサーバー
+
+ページ数・1ページあたりのリンク数・日本語URL・ブログ/お知らせ・同じテンプレートのページの割合・
+全ページ共通のフッターの行数・応答の遅延を指定できる。
+同じ引数なら毎回同じサイトになる。
+
+    python benchmarks/fake_site.py [--pages N] [--links N] [--latency 秒] [--port N]
+"""
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+
+SECTIONS = ['内科', '小児科', '皮膚科', '予防接種', '健康診断', 'アレルギー', '禁煙外来', '訪問診療']
+DOCTORS = ['山田太郎', '佐藤花子', '鈴木一郎', '高橋美咲']
+SENTENCES = [
+    '当院では地域のみなさまの健康を支えるため、丁寧な診察を心がけています。',
+    '発熱や咳などの症状がある方は、事前にお電話でご連絡ください。',
+    'お子さまの予防接種は予約制です。母子手帳をお持ちください。',
+    '生活習慣病の管理や健康診断の結果についてもお気軽にご相談ください。',
+    '駐車場を5台分ご用意しております。',
+    'Web予約は24時間受け付けています。',
+]
+
+class FakeSite:
+    def __init__(self, pages=50, links=8, japanese_ratio=0.3, blog_pages=20, news_pages=20, duplicate_ratio=0.0, footer_lines=60, seed=0):
+        rng = random.Random(seed)
+        self.duplicate_ratio = duplicate_ratio
+        self.template_paths = set()  # 本文がテンプレートのページ（ほぼ同じ内容のページの判定の答え合わせ用）
+        # 全ページ共通の大きなフッター（診療案内・アクセス等）。本文と同じ語彙を使い、1項目1行にする
+        self.footer = '\n'.join(
+            f'<li>{SECTIONS[j % len(SECTIONS)]}のご案内（{j + 1}）：{SENTENCES[j % len(SENTENCES)]}</li>' for j in range(footer_lines)
+        )
+        # 診療科ごとのテンプレートのように、本文がほぼ同じページに使う本文
+        self.template_body = ''.join(f'<p>診療のご案内（{i + 1}）。{SENTENCES[i % len(SENTENCES)]}</p>' for i in range(30))
+        self.paths = ['/']
+        for i in range(1, pages):
+            section = SECTIONS[i % len(SECTIONS)]
+            if rng.random() < japanese_ratio:
+                self.paths.append(f'/{section}/{i}/')
+            else:
+                self.paths.append(f'/medical/page{i}.html')
+        # クロール対象外のページ（リンクとしては出てくる）
+        self.excluded = [f'/blog/{i}/' for i in range(blog_pages)] + [f'/news/{i}/' for i in range(news_pages)]
+
+        # ナビゲーションは全ページ共通
+        self.nav = self.paths[:min(8, len(self.paths))] + ['/files/guide.pdf', '/img/top.jpg']
+        self.template_links = self.paths[1:1 + links] + self.excluded[:3]
+
+        self.pages = {}
+        for i, path in enumerate(self.paths):
+            others = [p for p in self.paths if p != path]
+            related = rng.sample(others, min(links, len(others))) + rng.sample(self.excluded, min(3, len(self.excluded)))
+            self.pages[path] = self.render(i, path, related, rng)
+
+    def render(self, index, path, related, rng):
+        section = SECTIONS[index % len(SECTIONS)] if index else 'トップ'
+        # テンプレートのページ以外は内容が重ならないように、ページ固有の文を混ぜる
+        body = ''.join(f'<p>{section}のご案内{index}-{n}。{rng.choice(SENTENCES)}</p>' for n in range(rng.randint(2, 30)))
+        doctor = rng.choice(DOCTORS)
+        if index and rng.random() < self.duplicate_ratio:
+            body, doctor, related = self.template_body, DOCTORS[0], self.template_links
+            self.template_paths.add(path)
+        nav = link_list(self.nav)
+        return f"""<!DOCTYPE html>
+<html lang="ja"><head><meta charset="utf-8">
+<title>{section}｜ベンチ内科クリニック</title>
+<meta name="description" content="{section}のご案内。ベンチ内科クリニックは東京都渋谷区の内科・小児科です。">
+<style>body {{ font-family: sans-serif; }}</style>
+<script>window.dataLayer = [];</script>
+</head><body>
+<header><h1>ベンチ内科クリニック</h1><nav><ul>{nav}</ul></nav></header>
+<main><h2>{section}</h2>
+<p>院長 {doctor} からのご挨拶</p>
+<p>経歴：〇〇大学医学部卒業、{doctor}は△△病院勤務を経て開院</p>
+{body}
+<h3>関連ページ</h3><ul>{link_list(related)}</ul></main>
+<footer><ul>
+{self.footer}
+</ul><address>東京都渋谷区神南1-2-3</address><p>診療時間 9:00〜18:00 休診日 日曜・祝日</p></footer>
+</body></html>""".encode('utf-8')
+
+    def sitemap(self, base_url):
+        urls = ''.join(f'<url><loc>{base_url}{quote(path)}</loc></url>' for path in self.paths)
+        return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'.encode('utf-8')
+
+def link_list(links):
+    return ''.join(f'<li><a href="{quote(link)}">{section_name(link)}</a></li>' for link in links)
+
+def section_name(path):
+    return unquote(path).strip('/').split('/')[0] or 'トップ'
+
+def make_handler(site, latency=0.0, sitemap=True):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-Aliveを有効にする
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            path = unquote(self.path.split('?', 1)[0])
+            if path == '/robots.txt':
+                base_url = f'http://{self.headers["Host"]}'
+                lines = ['User-agent: *', 'Disallow: /private/']
+                if sitemap:
+                    lines.append(f'Sitemap: {base_url}/sitemap.xml')
+                self.send(200, '\n'.join(lines).encode('utf-8'), 'text/plain')
+            elif path == '/sitemap.xml' and sitemap:
+                self.send(200, site.sitemap(f'http://{self.headers["Host"]}'), 'application/xml')
+            elif path in site.pages:
+                self.send(200, site.pages[path], 'text/html; charset=utf-8')
+            elif path in site.excluded:
+                self.send(200, '<html><body>記事</body></html>'.encode('utf-8'), 'text/html; charset=utf-8')
+            else:
+                self.send(404, b'not found', 'text/plain')
+
+        def send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+def serve(site, port=0, latency=0.0, sitemap=True):
+    # 別スレッドで起動し、サーバーを返す（port=0 で空いているポートを使う）
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(site, latency, sitemap))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--links', type=int, default=8, help='ナビゲーション以外に1ページから張るリンク数')
+    parser.add_argument('--japanese-ratio', type=float, default=0.3, help='日本語URLのページの割合')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.0, help='同じテンプレートの本文のページの割合')
+    parser.add_argument('--footer-lines', type=int, default=60, help='全ページ共通のフッターの行数')
+    parser.add_argument('--latency', type=float, default=0.0, help='1リクエストあたりの遅延（秒）')
+    parser.add_argument('--no-sitemap', action='store_true')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    site = FakeSite(args.pages, args.links, args.japanese_ratio, duplicate_ratio=args.duplicate_ratio, footer_lines=args.footer_lines)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(site, args.latency, not args.no_sitemap))
+    print(f"http://127.0.0.1:{args.port}/ ({len(site.paths)}ページ)")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""ベンチマーク用のOpenAI互換APIのモック（/v1/chat/completions のみ）
+
+応答の遅延と429の割合を指定できる。OPENAI_BASE_URL をこのサーバーに向けて使う。
+
+    python benchmarks/mock_llm.py [--latency 秒] [--rate-limit-ratio 0.1] [--port N]
+    OPENAI_BASE_URL=http://127.0.0.1:8766/v1 OPENAI_API_KEY=dummy streamlit run app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE_ID_PATTERN = re.compile(r'ページID: (\d+)')
+
+class MockStats:
+    def __init__(self):
+        self.requests = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    def count(self, rate_limited):
+        with self._lock:
+            self.requests += 1
+            if rate_limited:
+                self.rate_limited += 1
+
+def estimate_tokens(text):
+    # 日本語が中心なので1文字1トークン程度として概算する
+    return len(text)
+
+def proposals_text(page_id=None):
+    prefix = f'ページ{page_id}の' if page_id else ''
+    titles = [f'{prefix}タイトル案{i}｜渋谷区のベンチ内科クリニック' for i in (1, 2, 3)]
+    descriptions = [f'{prefix}ディスクリプション案{i}。東京都渋谷区のベンチ内科クリニックです。' for i in (1, 2, 3)]
+    return titles, descriptions
+
+def completion_content(body):
+    prompt = body['messages'][1]['content'] if len(body.get('messages', [])) > 1 else ''
+    if body.get('response_format'):
+        pages = []
+        for page_id in PAGE_ID_PATTERN.findall(prompt):
+            titles, descriptions = proposals_text(page_id)
+            pages.append({'id': int(page_id), 'titles': titles, 'descriptions': descriptions})
+        return json.dumps({'pages': pages}, ensure_ascii=False)
+    titles, descriptions = proposals_text()
+    lines = [f'タイトル案{i}: {title}' for i, title in enumerate(titles, 1)]
+    lines += [f'ディスクリプション案{i}: {description}' for i, description in enumerate(descriptions, 1)]
+    return '\n'.join(lines)
+
+def make_handler(latency=0.5, jitter=0.2, rate_limit_ratio=0.0, retry_after=1.0, stats=None, seed=0):
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                return self.send_json(404, {'error': {'message': 'not found', 'type': 'invalid_request_error'}})
+
+            with rng_lock:
+                rate_limited = rng.random() < rate_limit_ratio
+                delay = max(0.0, latency + rng.uniform(-jitter, jitter))
+            if stats:
+                stats.count(rate_limited)
+            if rate_limited:
+                return self.send_json(
+                    429,
+                    {'error': {'message': 'Rate limit reached (mock)', 'type': 'requests', 'code': 'rate_limit_exceeded'}},
+                    {'retry-after': f'{retry_after:g}', 'retry-after-ms': str(int(retry_after * 1000))},
+                )
+
+            time.sleep(delay)
+            content = completion_content(body)
+            prompt_tokens = sum(estimate_tokens(message.get('content') or '') for message in body.get('messages', []))
+            completion_tokens = estimate_tokens(content)
+            self.send_json(200, {
+                'id': 'chatcmpl-mock',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'mock'),
+                'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens,
+                },
+            })
+
+        def send_json(self, status, payload, headers=None):
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+def serve(port=0, **options):
+    # 別スレッドで起動し、サーバーを返す（port=0 で空いているポートを使う）
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(**options))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.5, help='応答までの時間（秒）')
+    parser.add_argument('--jitter', type=float, default=0.2, help='応答時間のばらつき（±秒）')
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.0, help='429を返す割合（0〜1）')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='429で返すRetry-After（秒）')
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.latency, args.jitter, args.rate_limit_ratio, args.retry_after))
+    print(f"OPENAI_BASE_URL=http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+CONTENT_TOKEN_BUDGET = 1500  # プロンプトに含めるページコンテンツのトークン数の上限
+TOKENIZER_MODEL = "gpt-4o-mini"
+
+BOILERPLATE_MIN_PAGES = 3  # これより少ないページ数では共通部分の判定をしない
+BOILERPLATE_RATIO = 0.5  # このページ割合以上に出てくる行をヘッダー/フッター等の共通部分とみなす
+
+WHITESPACE_PATTERN = re.compile(r'\s+')  # 全角スペースも含む
+CJK_PATTERN = re.compile(r'[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    # tiktokenが使えない環境（未インストール、エンコーディングを取得できない等）ではNone
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+    except Exception as e:
+        print(f"tiktoken を使用できないため、文字数からトークン数を概算します: {e}")
+        return None
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    # 概算: 日本語は1文字1トークン、それ以外は4文字1トークン
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+def truncate_to_tokens(text, budget=CONTENT_TOKEN_BUDGET):
+    encoding = get_encoding()
+    if encoding:
+        tokens = encoding.encode(text)
+        return text if len(tokens) <= budget else encoding.decode(tokens[:budget])
+    # 概算では1文字が1トークンを超えないので、budget文字までは必ず収まり、budget*4文字を超えると必ず溢れる
+    if len(text) <= budget:
+        return text
+    if count_tokens(text) <= budget:
+        return text
+    # 二分探索で上限に収まる長さを求める
+    low, high = budget, min(len(text), budget * 4)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+def split_blocks(content):
+    # 行ごとに空白をまとめ、空行を除く
+    blocks = []
+    for line in content.splitlines():
+        line = WHITESPACE_PATTERN.sub(' ', line).strip()
+        if line:
+            blocks.append(line)
+    return blocks
+
+class BoilerplateDetector:
+    # 同じサイトの多くのページに出てくる行（ナビゲーション、フッター等）を検出する
+    def __init__(self, min_pages=BOILERPLATE_MIN_PAGES, ratio=BOILERPLATE_RATIO):
+        self.min_pages = min_pages
+        self.ratio = ratio
+        self.page_count = 0
+        self.block_counts = Counter()
+
+    def observe(self, content):
+        self.page_count += 1
+        self.block_counts.update(set(split_blocks(content)))
+
+    def is_boilerplate(self, block, ratio=None):
+        # ratio を渡すと、BOILERPLATE_RATIO の代わりにその割合で判定する
+        if self.page_count < self.min_pages:
+            return False
+        return self.block_counts[block] >= max(2, math.ceil(self.page_count * (ratio or self.ratio)))
+
+    def strip(self, content, ratio=None):
+        return '\n'.join(block for block in split_blocks(content) if not self.is_boilerplate(block, ratio))
+
+def build_detector(pages):
+    detector = BoilerplateDetector()
+    for data in pages:
+        detector.observe(data['content'])
+    return detector
+
+def compact_pages(processed_data, detector=None, budget=CONTENT_TOKEN_BUDGET):
+    # 空白の圧縮・共通部分の除去を行い、トークン数の上限に収める
+    detector = detector or build_detector(processed_data.values())
+    compacted = {}
+    for page, data in processed_data.items():
+        compacted[page] = dict(data, content=truncate_to_tokens(detector.strip(data['content']), budget))
+    return compacted
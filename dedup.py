@@ -0,0 +1,98 @@
+import re
+
+from compactor import WHITESPACE_PATTERN
+
+FINGERPRINT_BITS = 64
+FINGERPRINT_MASK = (1 << FINGERPRINT_BITS) - 1
+SHINGLE_SIZE = 4  # 日本語は単語に区切らず、4文字ずつずらした部分文字列を特徴にする
+DUPLICATE_MAX_DISTANCE = 3  # SimHashのハミング距離がこれ以下なら同じ内容のページとみなす
+DUPLICATE_MIN_LENGTH = 200  # ページ固有の本文がこれより短いページは特徴が少なく誤判定しやすいので対象外
+# この割合以上のページに出てくる行をサイト共通のナビゲーション・フッター等とみなし、指紋に含めない。
+# 診療科ごとのテンプレートの本文も多くのページに出てくるので、プロンプト用の共通部分の判定（BOILERPLATE_RATIO）より高くする
+SITE_CHROME_RATIO = 0.8
+
+# タイトルのページ名とサイト名の区切り（「内科｜〇〇クリニック」の「内科」がページ名）
+PAGE_NAME_SEPARATOR = re.compile(r'\s*[｜|│\-–—:：]\s*')
+
+def simhash(text):
+    # 特徴ごとのハッシュの各ビットを多数決した64ビットの指紋（似た文章ほど一致するビットが多い）
+    # hash() はプロセスごとに値が変わるので、指紋は保存せず同じ実行の中だけで比べる
+    text = WHITESPACE_PATTERN.sub(' ', text)
+    hashes = {hash(text[i:i + SHINGLE_SIZE]) & FINGERPRINT_MASK for i in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+    threshold = len(hashes) / 2
+    fingerprint = 0
+    for bit in range(FINGERPRINT_BITS):
+        mask = 1 << bit
+        if sum(1 for h in hashes if h & mask) > threshold:
+            fingerprint |= mask
+    return fingerprint
+
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
+
+def fingerprint_page(data, detector):
+    # サイト共通の部分を除いた、ページ固有の本文から指紋を作る。ページ固有の本文が短すぎる場合や、
+    # 共通部分を判定できるだけのページがまだ集まっていない場合はNone
+    # （共通部分が大きいサイトでは、共通部分を含めると内容の違うページでも指紋が近くなる）
+    if detector.page_count < detector.min_pages:
+        return None
+    text = detector.strip(data['content'], ratio=SITE_CHROME_RATIO)
+    # 提案はページ名を差し替えて流用するので、ページ名だけが違うページは同じ内容とみなす
+    name = page_name(data['title'])
+    if name:
+        text = text.replace(name, '')
+    if len(text) < DUPLICATE_MIN_LENGTH:
+        return None
+    return simhash(text)
+
+class DuplicateIndex:
+    # 指紋をビットの帯に分けて索引する。距離が max_distance 以下なら
+    # max_distance + 1 個の帯のどれかは必ず完全一致するので、その帯の候補だけを比べればよい
+    def __init__(self, max_distance=DUPLICATE_MAX_DISTANCE):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        edges = [FINGERPRINT_BITS * i // bands for i in range(bands + 1)]
+        self.bands = [((1 << (end - start)) - 1, start) for start, end in zip(edges, edges[1:])]
+        self.tables = [{} for _ in self.bands]
+        self.count = 0
+
+    def _band_values(self, fingerprint):
+        return [(fingerprint >> shift) & mask for mask, shift in self.bands]
+
+    def find(self, fingerprint):
+        # 最初に登録された近いページ（代表ページ）のキーを返す
+        best = None
+        for table, value in zip(self.tables, self._band_values(fingerprint)):
+            for order, key, other in table.get(value, []):
+                if hamming_distance(fingerprint, other) <= self.max_distance and (best is None or order < best[0]):
+                    best = (order, key)
+        return best[1] if best else None
+
+    def add(self, key, fingerprint):
+        order = self.count
+        self.count += 1
+        for table, value in zip(self.tables, self._band_values(fingerprint)):
+            table.setdefault(value, []).append((order, key, fingerprint))
+
+def page_name(title):
+    return PAGE_NAME_SEPARATOR.split(title.strip(), 1)[0] if title else ''
+
+def adapt_proposals(proposals, source_title, source_page, data):
+    # 代表ページの提案を、ほぼ同じ内容の別ページ用に作り直す。
+    # 提案の冒頭のページ名だけを差し替え、どのページの提案を流用したかを duplicate_of に残す
+    source_name = page_name(source_title)
+    target_name = page_name(data['title'])
+
+    def replace_name(text):
+        if source_name and target_name and source_name != target_name and text.startswith(source_name):
+            return target_name + text[len(source_name):]
+        return text
+
+    return {
+        'current_title': data['title'],
+        'current_description': data['description'],
+        'clinic_address': proposals['clinic_address'],
+        'proposed_titles': [replace_name(title) for title in proposals['proposed_titles']],
+        'proposed_descriptions': [replace_name(desc) for desc in proposals['proposed_descriptions']],
+        'duplicate_of': source_page,
+    }
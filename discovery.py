@@ -0,0 +1,134 @@
+import gzip
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+import xml.etree.ElementTree as ET
+
+import requests
+
+DISCOVERY_TIMEOUT = 10  # robots.txt / sitemap.xml 取得のタイムアウト（秒）
+MAX_SITEMAPS = 50  # サイトマップインデックスから辿るサイトマップ数の上限
+MAX_SITEMAP_URLS = 50000  # サイトマップ1つあたりのURL数の上限（仕様上の上限と同じ）
+DEFAULT_PRIORITY = 0.5
+
+class SiteDiscovery:
+    # robots.txtとsitemap.xmlから得た情報
+    def __init__(self, robots=None, user_agent='*', entries=None):
+        self.robots = robots
+        self.user_agent = user_agent
+        self.entries = entries or []  # (loc, priority, lastmod) を優先度順に並べたもの
+
+    @property
+    def crawl_delay(self):
+        if not self.robots:
+            return None
+        delay = self.robots.crawl_delay(self.user_agent)
+        return float(delay) if delay else None
+
+    def can_fetch(self, url):
+        return self.robots is None or self.robots.can_fetch(self.user_agent, url)
+
+    def urls(self):
+        return [loc for loc, _, _ in self.entries]
+
+    def lastmods(self):
+        return {loc: lastmod for loc, _, lastmod in self.entries if lastmod}
+
+def discover_site(session, start_url):
+    parsed = urlparse(start_url)
+    root = f"{parsed.scheme}://{parsed.netloc}/"
+    user_agent = session.headers.get('User-Agent', '*')
+
+    robots = fetch_robots(session, urljoin(root, 'robots.txt'))
+    sitemap_urls = (robots.site_maps() if robots else None) or [urljoin(root, 'sitemap.xml')]
+
+    entries = []
+    seen_sitemaps = set()
+    pending = list(sitemap_urls)
+    while pending and len(seen_sitemaps) < MAX_SITEMAPS:
+        sitemap_url = pending.pop(0)
+        if sitemap_url in seen_sitemaps:
+            continue
+        seen_sitemaps.add(sitemap_url)
+        children, urls = fetch_sitemap(session, sitemap_url)
+        pending.extend(children)  # サイトマップインデックスの場合は子サイトマップを辿る
+        entries.extend(urls)
+
+    # 優先度の高い順、同じ優先度なら更新日時の新しい順
+    entries.sort(key=lambda entry: (-entry[1], -(entry[2] or 0)))
+    return SiteDiscovery(robots, user_agent, entries)
+
+def fetch_robots(session, robots_url):
+    try:
+        response = session.get(robots_url, timeout=DISCOVERY_TIMEOUT)
+    except requests.RequestException as e:
+        print(f"robots.txt の取得に失敗しました: {e}")
+        return None
+    if response.status_code != 200:
+        return None
+    robots = RobotFileParser(robots_url)
+    robots.parse(response.text.splitlines())
+    return robots
+
+def fetch_sitemap(session, sitemap_url):
+    # (子サイトマップのURL一覧, (loc, priority, lastmod) の一覧) を返す
+    try:
+        response = session.get(sitemap_url, timeout=DISCOVERY_TIMEOUT)
+        if response.status_code != 200:
+            return [], []
+        body = response.content
+        if body[:2] == b'\x1f\x8b':  # gzip圧縮されたサイトマップ
+            body = gzip.decompress(body)
+        root = ET.fromstring(body)
+    except (requests.RequestException, OSError, ET.ParseError) as e:
+        print(f"サイトマップの取得に失敗しました: {sitemap_url} - {e}")
+        return [], []
+
+    kind = local_name(root.tag)
+    if kind == 'sitemapindex':
+        return [child_text(item, 'loc') for item in root if child_text(item, 'loc')], []
+    if kind != 'urlset':
+        return [], []
+
+    urls = []
+    for item in root:
+        loc = child_text(item, 'loc')
+        if not loc:
+            continue
+        urls.append((loc, parse_priority(child_text(item, 'priority')), parse_lastmod(child_text(item, 'lastmod'))))
+        if len(urls) >= MAX_SITEMAP_URLS:
+            break
+    return [], urls
+
+def local_name(tag):
+    # 名前空間を除いたタグ名
+    return tag.rsplit('}', 1)[-1]
+
+def child_text(element, name):
+    for child in element:
+        if local_name(child.tag) == name and child.text:
+            return child.text.strip()
+    return None
+
+def parse_priority(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PRIORITY
+
+def parse_lastmod(value):
+    # W3C Datetime（例: 2024-05-01, 2024-05-01T10:00:00+09:00）をUNIX時刻に変換
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if len(value) == len('2024-05-01'):
+        # 日付だけの場合はその日のうちに更新されていても分からないので、その日の終わり（翌日0時）とみなす
+        # （取得した日と同じ日に更新されたページの取得を省略しないように）
+        parsed += timedelta(days=1)
+    return parsed.timestamp()
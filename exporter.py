@@ -0,0 +1,187 @@
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+
+RECORD_HEADER = ['ページURL', '項目', '内容', '文字数']
+PARQUET_ROW_GROUP_SIZE = 1000  # Parquetに書き出す1回あたりの行数
+
+def page_items(proposals):
+    # (項目名, 内容) を Excel の並び順で返す
+    yield '現在のタイトル', proposals.get('current_title', '')
+    for i, title in enumerate(proposals.get('proposed_titles', []), 1):
+        yield f'タイトル案{i}', title
+    yield '現在のディスクリプション', proposals.get('current_description', '')
+    for i, desc in enumerate(proposals.get('proposed_descriptions', []), 1):
+        yield f'ディスクリプション案{i}', desc
+
+def page_row_count(proposals):
+    # 見出し行 + 各項目 + 空行
+    return 2 + len(proposals.get('proposed_titles', [])) + 1 + len(proposals.get('proposed_descriptions', [])) + 1
+
+class ExcelExporter:
+    # openpyxlのwrite-onlyモードでExcelを書き出す。
+    # write-onlyでは列幅を先に決める必要があるので、add() では列幅を更新しながら
+    # ページ単位で一時ファイルに退避し、close() でまとめて書き出す（セルのオブジェクトをメモリに持たない）
+    def __init__(self, file):
+        self.file = file
+        self.widths = {}
+        self.rows = 0
+        self._spool = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+        self._offsets = {}
+
+    def add(self, page, proposals):
+        self._offsets[page] = self._spool.tell()
+        self._spool.write(json.dumps([page, proposals], ensure_ascii=False) + '\n')
+        self._track(1, 'ページURL')
+        self._track(2, page)
+        for label, text in page_items(proposals):
+            self._track(1, label)
+            self._track(2, text)
+        self.rows += page_row_count(proposals)
+
+    def _track(self, column, value):
+        self.widths[column] = max(self.widths.get(column, 0), len(str(value)))
+
+    def close(self, order=None):
+        # order を渡すとその順番（クロール順など）で書き出す。省略時は add() した順
+        # openpyxlのimportは重いので、書き出すときに読み込む
+        from openpyxl import Workbook
+        from openpyxl.utils import get_column_letter
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        if self.rows:
+            # 文字数の列は見出しと、最も長くなる最後の数式（最後の空行の1つ前）で決まる
+            self.widths[3] = max(len('文字数'), len(f'=LEN(B{self.rows - 1})'))
+            for column, width in self.widths.items():
+                ws.column_dimensions[get_column_letter(column)].width = width + 2
+
+        row_num = 1
+        for page in (order if order is not None else self._offsets):
+            if page not in self._offsets:
+                continue
+            self._spool.seek(self._offsets[page])
+            page, proposals = json.loads(self._spool.readline())
+            ws.append(['ページURL', page, '文字数'])
+            row_num += 1
+            for label, text in page_items(proposals):
+                ws.append([label, text, f'=LEN(B{row_num})'])
+                row_num += 1
+            ws.append([])  # 空行を挿入
+            row_num += 1
+
+        wb.save(self.file)
+        self._spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._spool.close()
+
+class CsvExporter:
+    # 1行1項目の縦長の表として、add() のたびにそのまま書き出す
+    def __init__(self, file):
+        self._owns_file = isinstance(file, (str, os.PathLike))
+        # Excelで開いたときに文字化けしないようにBOM付きUTF-8
+        self.file = open(file, 'w', newline='', encoding='utf-8-sig') if self._owns_file else file
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(RECORD_HEADER)
+
+    def add(self, page, proposals):
+        for label, text in page_items(proposals):
+            self.writer.writerow([page, label, text, len(text)])
+        self.file.flush()
+
+    def close(self, order=None):
+        if self._owns_file:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+class ParquetExporter:
+    # CSVと同じ縦長の表を、一定の行数ごとにParquetのrow groupとして書き出す（pyarrowが必要）
+    def __init__(self, file):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquetで出力するには pyarrow をインストールしてください")
+        self.pa = pa
+        self.schema = pa.schema([
+            ('page_url', pa.string()), ('item', pa.string()), ('text', pa.string()), ('length', pa.int32()),
+        ])
+        self.writer = pq.ParquetWriter(file, self.schema)
+        self.buffer = []
+
+    def add(self, page, proposals):
+        for label, text in page_items(proposals):
+            self.buffer.append((page, label, text, len(text)))
+        if len(self.buffer) >= PARQUET_ROW_GROUP_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        columns = list(zip(*self.buffer))
+        self.writer.write_table(self.pa.Table.from_arrays([list(column) for column in columns], schema=self.schema))
+        self.buffer = []
+
+    def close(self, order=None):
+        self._flush()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+EXPORTERS = {
+    'xlsx': ExcelExporter,
+    'csv': CsvExporter,
+    'parquet': ParquetExporter,
+}
+
+def open_exporter(file, format=None):
+    # format を省略した場合はファイルの拡張子で決める
+    if format is None:
+        format = os.path.splitext(str(file))[1].lstrip('.').lower()
+    if format not in EXPORTERS:
+        raise ValueError(f"対応していない出力形式です: {format}（{', '.join(EXPORTERS)}）")
+    return EXPORTERS[format](file)
+
+def extract_clinic_name(scraped_data):
+    # トップページのタイトルからクリニック名を抽出（出力ファイル名に使う）
+    for url, data in scraped_data.items():
+        if url.endswith('/') or url.endswith('/index.html'):
+            title = data['title']
+            # クリニック名を抽出する正規表現パターン
+            match = re.search(r'(.+?)(クリニック|病院|医院)', title)
+            if match:
+                return match.group(0)
+    return "クリニック"  # デフォルト名
+
+def export(seo_proposals, format='xlsx'):
+    # ダウンロード用にメモリ上のファイルとして書き出す（先頭にシーク済み）
+    buffer = io.BytesIO()
+    # CSVはBOM付きUTF-8のテキストとして書き込む
+    file = io.TextIOWrapper(buffer, encoding='utf-8-sig', newline='') if format == 'csv' else buffer
+    exporter = open_exporter(file, format)
+    for page, proposals in seo_proposals.items():
+        exporter.add(page, proposals)
+    exporter.close()
+    if format == 'csv':
+        file.detach()  # buffer を閉じずにテキストのラッパーだけ外す
+    buffer.seek(0)
+    return buffer
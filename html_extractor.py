@@ -0,0 +1,88 @@
+from html.parser import HTMLParser
+
+# get_text()と同様に、これらの要素の中身は本文に含めない
+SKIP_CONTENT_TAGS = {'script', 'style', 'template'}
+
+DEFAULT_ADDRESS = "住所抽出済み"
+
+class PageExtractor(HTMLParser):
+    # 1回の走査でタイトル・ディスクリプション・住所・本文・リンクを集める
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.description = None
+        self.address = None
+        self.hrefs = []
+        self._text = []
+        self._skip_depth = 0
+        self._title_parts = None
+        self._address_parts = None
+        self._address_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_CONTENT_TAGS:
+            self._skip_depth += 1
+        elif tag == 'title' and self.title is None and self._title_parts is None:
+            self._title_parts = []
+        elif tag == 'address':
+            if self.address is None and self._address_parts is None:
+                self._address_parts = []
+            if self._address_parts is not None:
+                self._address_depth += 1
+        elif tag == 'a':
+            for name, value in attrs:
+                if name == 'href':
+                    self.hrefs.append(value or '')
+                    break
+        elif tag == 'meta' and self.description is None:
+            attrs = dict(attrs)
+            name = attrs.get('name')
+            if name and name.lower() == 'description':
+                self.description = (attrs.get('content') or '').strip()
+
+    def handle_startendtag(self, tag, attrs):
+        # <meta ... /> や <a ... /> のような自己終了タグ
+        if tag in ('meta', 'a'):
+            self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_CONTENT_TAGS:
+            if self._skip_depth:
+                self._skip_depth -= 1
+        elif tag == 'title' and self._title_parts is not None:
+            self.title = ''.join(self._title_parts).strip()
+            self._title_parts = None
+        elif tag == 'address' and self._address_parts is not None:
+            self._address_depth -= 1
+            if self._address_depth == 0:
+                self.address = ''.join(self._address_parts).strip()
+                self._address_parts = None
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        self._text.append(data)
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+        if self._address_parts is not None:
+            self._address_parts.append(data)
+
+    def result(self):
+        # 閉じタグのないまま終わった要素も拾っておく
+        if self.title is None and self._title_parts is not None:
+            self.title = ''.join(self._title_parts).strip()
+        if self.address is None and self._address_parts is not None:
+            self.address = ''.join(self._address_parts).strip()
+        return {
+            'title': self.title or '',
+            'description': self.description or '',
+            'content': ''.join(self._text),
+            'address': self.address if self.address is not None else DEFAULT_ADDRESS,
+            'hrefs': self.hrefs,
+        }
+
+def extract_page(html):
+    parser = PageExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.result()
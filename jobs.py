@@ -0,0 +1,185 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_cache import DEFAULT_CACHE_DIR
+from telemetry import RunTelemetry
+
+DEFAULT_JOB_WORKERS = int(os.getenv("SEO_JOB_WORKERS", "2"))  # 同時に実行する分析の数
+
+ACTIVE_STATUSES = ('queued', 'running')
+JOB_COLUMNS = (
+    'id', 'url', 'seo_goal', 'status', 'progress', 'message', 'result', 'error',
+    'cancel_requested', 'created_at', 'updated_at',
+)
+
+class JobCancelled(Exception):
+    pass
+
+class JobStore:
+    # 分析ジョブの状態・進捗・結果をSQLiteに保存する（ブラウザの再読み込みや別のセッションからも参照できるように）
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "jobs.sqlite3")
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, url TEXT NOT NULL, seo_goal TEXT NOT NULL, status TEXT NOT NULL, "
+                "progress REAL NOT NULL DEFAULT 0, message TEXT, result TEXT, error TEXT, "
+                "cancel_requested INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_url_goal ON jobs (url, seo_goal, status)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create_or_get(self, url, seo_goal):
+        # 同じURL・SEO目標のジョブが実行中なら、新しく作らずにそのジョブを返す
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE url = ? AND seo_goal = ? AND status IN (?, ?) AND cancel_requested = 0 "
+                "ORDER BY created_at DESC LIMIT 1",
+                (url, seo_goal, *ACTIVE_STATUSES),
+            ).fetchone()
+            if row:
+                return row[0], False
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, url, seo_goal, status, message, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, url, seo_goal, "順番待ち...", now, now),
+            )
+            return job_id, True
+
+    def get(self, job_id):
+        with self._lock, self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row:
+            return None
+        job = dict(zip(JOB_COLUMNS, row))
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def _update(self, job_id, **fields):
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'], ensure_ascii=False)
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def start(self, job_id):
+        self._update(job_id, status='running', message="分析を開始しました")
+
+    def update_progress(self, job_id, progress, message):
+        self._update(job_id, progress=progress, message=message)
+
+    def save_result(self, job_id, result):
+        self._update(job_id, result=result)
+
+    def finish(self, job_id, status, result=None, error=None, message=None):
+        fields = {'status': status, 'error': error}
+        if result is not None:
+            fields['result'] = result
+        if message is not None:
+            fields['message'] = message
+        if status == 'done':
+            fields['progress'] = 1.0
+        self._update(job_id, **fields)
+
+    def request_cancel(self, job_id):
+        self._update(job_id, cancel_requested=1)
+
+    def fail_unfinished(self, message):
+        # 前回のプロセスで実行中・待機中のまま終わったジョブ（サーバーの再起動等）
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE status IN (?, ?)",
+                (message, time.time(), *ACTIVE_STATUSES),
+            )
+
+class JobManager:
+    # 分析をバックグラウンドのスレッドで実行する（Streamlitのスクリプトは進捗を読むだけ）
+    def __init__(self, store=None, page_store=None, max_workers=DEFAULT_JOB_WORKERS, batch_size=None):
+        self.store = store or JobStore()
+        self.page_store = page_store
+        self.batch_size = batch_size  # None の場合は seo_optimizer.DEFAULT_BATCH_SIZE
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="seo-job")
+        self._cancel_events = {}
+        self._lock = threading.Lock()
+        self.store.fail_unfinished("サーバーの再起動により中断されました")
+
+    def submit(self, url, seo_goal):
+        job_id, created = self.store.create_or_get(url, seo_goal)
+        if created:
+            with self._lock:
+                self._cancel_events[job_id] = threading.Event()
+            self.executor.submit(self._run, job_id)
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def cancel(self, job_id):
+        self.store.request_cancel(job_id)
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+        if event:
+            event.set()
+
+    def _run(self, job_id):
+        with self._lock:
+            cancel_event = self._cancel_events[job_id]
+        try:
+            job = self.store.get(job_id)
+            if cancel_event.is_set() or job['cancel_requested']:
+                self.store.finish(job_id, 'cancelled', message="キャンセルしました")
+                return
+            self.store.start(job_id)
+            result = self._analyze(job_id, job['url'], job['seo_goal'], cancel_event)
+            self.store.finish(job_id, 'done', result=result, message="完了")
+        except JobCancelled:
+            self.store.finish(job_id, 'cancelled', message="キャンセルしました")
+        except Exception as e:
+            print(f"Job {job_id} failed: {str(e)}")
+            self.store.finish(job_id, 'failed', error=str(e), message="エラーが発生しました")
+        finally:
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
+
+    def _analyze(self, job_id, url, seo_goal, cancel_event):
+        # 画面側（app.py）は最初の描画でジョブの状態だけを参照するので、分析の処理は実行時に読み込む
+        from pipeline import stream_site
+        from seo_optimizer import DEFAULT_BATCH_SIZE
+
+        def progress_callback(progress, message):
+            # 進捗の報告のたびにキャンセルを確認する（例外でstream_siteを抜けると後始末される）
+            if cancel_event.is_set():
+                raise JobCancelled()
+            self.store.update_progress(job_id, progress, message)
+
+        telemetry = RunTelemetry(run_id=url)
+        # pages はクロール順、proposals は提案ができた順（途中経過として画面に表示する）
+        result = {'pages': [], 'titles': {}, 'proposals': {}}
+        batch_size = self.batch_size or DEFAULT_BATCH_SIZE
+        for kind, page, value in stream_site(url, seo_goal, progress_callback, page_store=self.page_store, batch_size=batch_size, telemetry=telemetry):
+            if cancel_event.is_set():
+                raise JobCancelled()
+            if kind == 'page':
+                result['pages'].append(page)
+                result['titles'][page] = value['title']
+            else:
+                result['proposals'][page] = value
+                self.store.save_result(job_id, result)
+
+        result['telemetry_summary'] = telemetry.summary()
+        result['telemetry_totals'] = telemetry.totals()
+        return result
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from llm_cache import DEFAULT_CACHE_DIR
+
+def hash_body(body):
+    return hashlib.sha256(body).hexdigest()
+
+def hash_goal(seo_goal):
+    return hashlib.sha256(seo_goal.encode('utf-8')).hexdigest()
+
+class PageStore:
+    # クロール結果をnormalize_urlをキーにしてSQLiteに保存する（再クロール時の差分判定用）
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "pages.sqlite3")
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body_hash TEXT NOT NULL, "
+                "title TEXT, description TEXT, content TEXT, address TEXT, links TEXT, fetched_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS proposals ("
+                "url TEXT NOT NULL, goal_hash TEXT NOT NULL, body_hash TEXT NOT NULL, proposals TEXT NOT NULL, "
+                "PRIMARY KEY (url, goal_hash))"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, url):
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT etag, last_modified, body_hash, title, description, content, address, links, fetched_at "
+                "FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            'etag': row[0],
+            'last_modified': row[1],
+            'body_hash': row[2],
+            'title': row[3],
+            'description': row[4],
+            'content': row[5],
+            'address': row[6],
+            'links': json.loads(row[7] or '[]'),
+            'fetched_at': row[8],
+        }
+
+    def save(self, url, page, links, etag=None, last_modified=None):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, body_hash, title, description, content, address, links, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, page['body_hash'], page['title'], page['description'],
+                 page['content'], page['address'], json.dumps(links, ensure_ascii=False), time.time()),
+            )
+
+    def load_proposals(self, url, body_hash, seo_goal):
+        # 本文もSEO目標も前回と同じ場合のみ、保存済みの提案を返す
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT body_hash, proposals FROM proposals WHERE url = ? AND goal_hash = ?",
+                (url, hash_goal(seo_goal)),
+            ).fetchone()
+        if row and row[0] == body_hash:
+            return json.loads(row[1])
+        return None
+
+    def save_proposals(self, url, body_hash, seo_goal, proposals):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO proposals (url, goal_hash, body_hash, proposals) VALUES (?, ?, ?, ?)",
+                (url, hash_goal(seo_goal), body_hash, json.dumps(proposals, ensure_ascii=False)),
+            )
@@ -0,0 +1,189 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from scraper import iter_clinic_site, normalize_url, DEFAULT_MAX_PAGES
+from preprocessor import preprocess_data
+from seo_optimizer import (
+    DEFAULT_MAX_CONCURRENCY,
+    generate_batch_proposals,
+    generate_single_proposals,
+    is_incomplete_response,
+)
+from compactor import BoilerplateDetector, compact_pages
+from telemetry import NULL_TELEMETRY
+from dedup import DuplicateIndex, adapt_proposals, fingerprint_page
+
+def stream_site(clinic_url, seo_goal, progress_callback, page_store=None, max_pages=DEFAULT_MAX_PAGES, batch_size=1, max_concurrency=DEFAULT_MAX_CONCURRENCY, telemetry=None, dedup=True):
+    # スクレイピング・前処理・提案生成を並行して進める。
+    # ページを取得したら ('page', URL, ページ情報)、提案ができたら ('proposals', URL, 提案) を返す。
+    # progress_callback は呼び出し元のスレッドから呼ぶ（Streamlitの要素を別スレッドから更新しないため）
+    # telemetry を渡すと、取得・解析・匿名化・API呼び出しごとの所要時間やトークン数を記録する
+    # dedup が True の場合、ほぼ同じ内容のページ（ページ送り、印刷用、診療科ごとのテンプレート等）は
+    # 代表ページの提案だけを生成し、他のページはそれを流用する
+    telemetry = telemetry or NULL_TELEMETRY
+    events = queue.Queue()
+    stop = threading.Event()
+
+    def crawl():
+        try:
+            for page, data in iter_clinic_site(clinic_url, lambda p, m: events.put(('progress', p, m)), page_store=page_store, max_pages=max_pages, telemetry=telemetry):
+                events.put(('page', page, data))
+                if stop.is_set():
+                    break
+        except Exception as e:
+            events.put(('error', e, None))
+        finally:
+            events.put(('crawled', None, None))
+
+    crawler = threading.Thread(target=crawl, daemon=True)
+    crawler.start()
+
+    # サイト共通部分は、それまでに取得したページから逐次判定する
+    detector = BoilerplateDetector()
+    executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency))
+    seen = set()
+    group = {}
+    crawl_progress = 0.0
+    crawled = False
+    pending = 0
+    completed = 0
+
+    duplicates = DuplicateIndex() if dedup else None
+    representatives = {}  # 代表ページ -> ページ情報（タイトル）
+    resolved = {}  # 提案ができた代表ページ -> 提案
+    followers = {}  # 代表ページ -> 提案を待っている (ページ, ページ情報) のリスト
+    failed = set()  # 提案が不完全だった代表ページ（流用しない）
+    # 最初の数ページは共通部分を判定できないまま送信すると、ヘッダー・フッターがプロンプトの大半を占めるため、
+    # 判定できるだけのページが集まるまで保留する（集まったら None）
+    warming = []
+
+    def report(message):
+        generation_progress = completed / len(seen) if seen else 0.0
+        progress_callback(min(0.5 * crawl_progress + 0.5 * generation_progress, 1.0), message)
+
+    def submit(pages):
+        nonlocal pending
+        pending += len(pages)
+        generate = generate_batch_proposals if len(pages) > 1 else generate_single_proposals
+        future = executor.submit(generate, pages, seo_goal, telemetry)
+        future.add_done_callback(lambda f, pages=pages: events.put(('generated', pages, f)))
+
+    def enqueue(page, data):
+        # プロンプトに入る範囲だけを匿名化し、batch_size ページたまったら送信する
+        nonlocal group
+        group.update(preprocess_data({page: data}, telemetry=telemetry))
+        if len(group) >= max(1, batch_size):
+            submit(group)
+            group = {}
+
+    def release(representative, proposals):
+        # 代表ページの提案ができたら、待っているページに流用する
+        nonlocal completed
+        waiting = followers.pop(representative, [])
+        if is_incomplete_response(proposals):
+            # 代表ページの提案が不完全な場合は、それぞれ生成する
+            failed.add(representative)
+            for page, data in waiting:
+                enqueue(page, data)
+            return
+        resolved[representative] = proposals
+        for page, data in waiting:
+            adapted = adapt_proposals(proposals, representatives[representative]['title'], representative, data)
+            completed += 1
+            if page_store:
+                page_store.save_proposals(normalize_url(page), data['body_hash'], seo_goal, adapted)
+            report(f"SEO最適化提案生成中(GPT-4o-mini)... {completed}/{len(seen)} {page}")
+            yield 'proposals', page, adapted
+
+    def process(page, data):
+        nonlocal completed
+        # 共通部分の除去とトークン数の調整を先に行う
+        with telemetry.timer('compact', page):
+            compacted = compact_pages({page: data}, detector)[page]
+
+        fingerprint = None
+        if duplicates is not None:
+            with telemetry.timer('fingerprint', page):
+                fingerprint = fingerprint_page(data, detector)
+
+        # 前回から変更がないページは保存済みの提案を使い、前処理と提案生成を省略
+        reused = page_store.load_proposals(normalize_url(page), data.get('body_hash'), seo_goal) if page_store else None
+        if reused:
+            telemetry.record('proposals_reused', page)
+            completed += 1
+            if fingerprint is not None and 'duplicate_of' not in reused:
+                duplicates.add(page, fingerprint)
+                representatives[page] = compacted
+                resolved[page] = reused
+            yield 'proposals', page, reused
+            return
+
+        representative = duplicates.find(fingerprint) if fingerprint is not None else None
+        if representative and representative not in failed:
+            telemetry.record('duplicate', page, representative=representative)
+            followers.setdefault(representative, []).append((page, compacted))
+            if representative in resolved:
+                yield from release(representative, resolved[representative])
+            return
+        if fingerprint is not None:
+            duplicates.add(page, fingerprint)
+            representatives[page] = compacted
+
+        enqueue(page, compacted)
+
+    try:
+        while not crawled or pending or group:
+            if crawled and group:
+                # 残りのページをまとめて送信
+                submit(group)
+                group = {}
+                continue
+
+            kind, first, second = events.get()
+            if kind == 'progress':
+                crawl_progress = first
+                report(second)
+            elif kind == 'page':
+                page, data = first, second
+                if page in seen:
+                    continue
+                seen.add(page)
+                detector.observe(data['content'])
+                yield 'page', page, data
+
+                if warming is not None:
+                    # 共通部分を判定できるだけのページが集まるまで、トップページ等を保留する
+                    warming.append((page, data))
+                    if detector.page_count < detector.min_pages:
+                        continue
+                    held, warming = warming, None
+                    for held_page, held_data in held:
+                        yield from process(held_page, held_data)
+                    continue
+                yield from process(page, data)
+            elif kind == 'generated':
+                pages, future = first, second
+                results = future.result()
+                for page, proposals in results.items():
+                    pending -= 1
+                    completed += 1
+                    # 不完全な提案は保存せず、次回に再生成する
+                    if page_store and not is_incomplete_response(proposals):
+                        page_store.save_proposals(normalize_url(page), pages[page]['body_hash'], seo_goal, proposals)
+                    report(f"SEO最適化提案生成中(GPT-4o-mini)... {completed}/{len(seen)} {page}")
+                    yield 'proposals', page, proposals
+                    if page in representatives:
+                        yield from release(page, proposals)
+            elif kind == 'error':
+                raise first
+            elif kind == 'crawled':
+                crawled = True
+                crawl_progress = 1.0
+                # ページ数が少ないサイトは、保留していたページをそのまま処理する
+                held, warming = warming or [], None
+                for held_page, held_data in held:
+                    yield from process(held_page, held_data)
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
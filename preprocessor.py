@@ -1,18 +1,56 @@
 import re
+from compactor import CONTENT_TOKEN_BUDGET, truncate_to_tokens
+from telemetry import NULL_TELEMETRY
 
-def preprocess_data(scraped_data):
+# 医師名の直前に現れる肩書き・敬称（必要に応じて追加する）
+DEFAULT_HONORIFICS = ('理事長', '院長', '医師', '先生', 'Dr.', 'Dr')
+
+# 医師名とみなす文字（全角記号・ひらがな・カタカナ・漢字・半角カナ・空白）
+NAME_CHARS = r'[\u3000-\u303f\u3040-\u309f\u30a0-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff66-\uff9f\s]'
+
+REPLACEMENTS = {
+    'career': '経歴: [匿名化された経歴]',
+    'name': '[医師名]',
+}
+
+class Anonymizer:
+    # 医師名と経歴を1回の走査でまとめて匿名化する
+    def __init__(self, honorifics=DEFAULT_HONORIFICS):
+        titles = '|'.join(re.escape(title) for title in sorted(honorifics, key=len, reverse=True))
+        # 大文字小文字を区別しないのは肩書き部分（Dr. など）だけ
+        name = rf'(?i:{titles})\s*{NAME_CHARS}{{1,20}}'
+        # 経歴は行末まで。ただし行内の医師名が改行をまたぐ場合はその先まで含める
+        # （医師名→経歴の順に2回置換していた頃と同じ範囲になる）
+        self.pattern = re.compile(
+            rf'(?P<career>経歴[:：](?:[^\n]*?{name})*[^\n]*)|(?P<name>{name})'
+        )
+
+    def _replace(self, match):
+        return REPLACEMENTS[match.lastgroup]
+
+    def anonymize(self, content):
+        return self.pattern.sub(self._replace, content)
+
+default_anonymizer = Anonymizer()
+
+def preprocess_data(scraped_data, anonymizer=None, budget=CONTENT_TOKEN_BUDGET, telemetry=None):
+    # プロンプトに入る範囲だけを匿名化する
+    anonymizer = anonymizer or default_anonymizer
+    telemetry = telemetry or NULL_TELEMETRY
     processed_data = {}
     for page, data in scraped_data.items():
+        content = truncate_to_tokens(data['content'], budget)
+        with telemetry.timer('anonymize', page, chars=len(content)):
+            content = anonymizer.anonymize(content)
         processed_data[page] = {
             'title': data['title'],
             'description': data['description'],
-            'content': anonymize_content(data['content']),
-            'address': data['address']
+            'content': content,
+            'address': data['address'],
+            'body_hash': data.get('body_hash')
         }
     return processed_data
 
 def anonymize_content(content):
     # 医師名と経歴の匿名化（改良版）
-    content = re.sub(r'(理事長|院長|医師|先生|Dr\.?)\s*[\u3000-\u303f\u3040-\u309f\u30a0-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff66-\uff9f\s]{1,20}', '[医師名]', content, flags=re.IGNORECASE)
-    content = re.sub(r'経歴[:：].*?(?=\n|$)', '経歴: [匿名化された経歴]', content, flags=re.DOTALL)
-    return content
\ No newline at end of file
+    return default_anonymizer.anonymize(content)
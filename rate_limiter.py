@@ -0,0 +1,51 @@
+import threading
+import time
+
+class TokenBucket:
+    # 1分あたりの上限をもとに、一定速度で補充されるトークンバケット
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0  # 1秒あたりの補充量
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        # pause中は updated が未来の時刻になっているので補充しない
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def acquire(self, amount=1):
+        # 上限を超える要求はバケット容量まで切り詰める（永遠に待たないように）
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = max(0.0, self.updated - time.monotonic()) + (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        # 指定した秒数は補充を止め、残りも使えないようにする（429のRetry-Afterに合わせる）
+        with self._lock:
+            self._refill()
+            self.tokens = 0.0
+            self.updated = max(self.updated, time.monotonic() + seconds)
+
+class RateLimiter:
+    # リクエスト数/分（RPM）とトークン数/分（TPM）の両方を守る
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    def acquire(self, estimated_tokens):
+        self.requests.acquire(1)
+        self.tokens.acquire(estimated_tokens)
+
+    def pause(self, seconds):
+        # 429が返ってきたら、他のスレッドのリクエストもまとめて待たせる
+        self.requests.pause(seconds)
@@ -0,0 +1,201 @@
+import email.utils
+import random
+import threading
+import time
+
+DEFAULT_MAX_ATTEMPTS = 4  # 初回を含めた最大試行回数
+DEFAULT_BASE_DELAY = 1.0  # バックオフの初期待ち時間（秒）
+DEFAULT_MAX_DELAY = 30.0  # バックオフの待ち時間の上限（秒）
+
+BREAKER_FAILURE_THRESHOLD = 5  # 連続してこの回数失敗したら遮断する
+BREAKER_RESET_TIMEOUT = 30.0  # 遮断してから試しに1回通すまでの秒数
+BREAKER_TRIAL_POLL_INTERVAL = 0.5  # 試しに通している間、結果を確認する間隔（秒）
+
+RETRY_BUDGET_RATIO = 0.2  # 再試行はリクエスト数の2割まで
+RETRY_BUDGET_MAX_TOKENS = 10  # まとめて再試行できる回数の上限（起動直後もこれだけは再試行できる）
+
+class ResilienceError(Exception):
+    # 分類済みのエラー（元の例外は __cause__ に入る）
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class TransientError(ResilienceError):
+    # 時間をおけば成功する可能性があるエラー（5xx、タイムアウト、接続エラー）
+    pass
+
+class RateLimitedError(TransientError):
+    # 429 Too Many Requests
+    pass
+
+class PermanentError(ResilienceError):
+    # 再試行しても結果が変わらないエラー（404、認証エラー、リクエスト内容の誤り等）
+    pass
+
+class CircuitOpenError(ResilienceError):
+    # 失敗が続いているため、リクエストを送らずに失敗させた
+    pass
+
+def classify_status(status, message, retry_after=None):
+    if status == 429:
+        return RateLimitedError(message, status, retry_after)
+    if status in (408, 425) or status >= 500:
+        return TransientError(message, status, retry_after)
+    return PermanentError(message, status, retry_after)
+
+def parse_retry_after(value):
+    # Retry-After は秒数またはHTTP日付のどちらか
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+def backoff_delay(attempt, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY, rng=random):
+    # Full Jitter: 0〜(base * 2^attempt) の一様乱数（同時に失敗したリクエストの再送が重ならないように）
+    return rng.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+class RetryBudget:
+    # 全体の再試行の回数を、最近のリクエスト数に対する割合で制限する
+    # （障害時に再試行でリクエストが何倍にも膨らむのを防ぐ）。
+    # リクエストのたびに ratio 個ずつトークンがたまり（上限 max_tokens）、再試行1回で1個使う。
+    # 上限があるので、正常な期間が長く続いた後の障害でも、まとめて再試行できるのは max_tokens 回まで
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, max_tokens=RETRY_BUDGET_MAX_TOKENS):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = float(max_tokens)
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+class CircuitBreaker:
+    # キー（ホスト名など）ごとに、失敗が続いたら一定時間リクエストを止める
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = {}
+        self._opened_at = {}
+        self._trial = set()  # 遮断後、試しに通しているキー
+
+    def allow(self, key):
+        with self._lock:
+            opened_at = self._opened_at.get(key)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at < self.reset_timeout or key in self._trial:
+                return False
+            # 一定時間たったら1回だけ通し、結果で閉じるか再び遮断するかを決める
+            self._trial.add(key)
+            return True
+
+    def wait_time(self, key):
+        # allow() が False の場合に、次に試せるようになるまでの目安の秒数
+        with self._lock:
+            opened_at = self._opened_at.get(key)
+            if opened_at is None:
+                return 0.0
+            remaining = self.reset_timeout - (time.monotonic() - opened_at)
+            if remaining > 0:
+                return remaining
+            # 他の呼び出しが試しに通している間は、結果が出るまで少しずつ待つ
+            return min(BREAKER_TRIAL_POLL_INTERVAL, self.reset_timeout)
+
+    def record_success(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+            self._opened_at.pop(key, None)
+            self._trial.discard(key)
+
+    def record_failure(self, key):
+        with self._lock:
+            self._failures[key] = self._failures.get(key, 0) + 1
+            if key in self._trial or self._failures[key] >= self.failure_threshold:
+                self._opened_at[key] = time.monotonic()
+            self._trial.discard(key)
+
+# スクレイパーとOpenAI呼び出しで共有する再試行の予算
+default_budget = RetryBudget()
+
+class RetryPolicy:
+    # 分類したエラーに応じて、指数バックオフ（ジッター付き）で再試行する
+    def __init__(self, classify, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, budget=None, breaker=None, sleep=time.sleep):
+        self.classify = classify  # 例外 -> ResilienceError
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or default_budget
+        self.breaker = breaker or CircuitBreaker()
+        self.sleep = sleep
+
+    def call(self, func, key=None, on_retry=None, max_attempts=None):
+        # on_retry(attempt, error, delay) は待機の直前に呼ばれる（ログ・計測・レート制限の調整用）
+        max_attempts = max(1, max_attempts or self.max_attempts)
+        for attempt in range(max_attempts):
+            self.wait_for_breaker(key, max_attempts)
+            self.budget.record_request()
+            try:
+                result = func()
+            except Exception as e:
+                if isinstance(e, ResilienceError):
+                    error = e
+                else:
+                    error = self.classify(e)
+                    error.__cause__ = e
+                if not isinstance(error, TransientError) or isinstance(error, RateLimitedError):
+                    # 404等や429はサーバーが応答しているので、遮断の判定には数えない
+                    # （429は呼び出し側でレート制限を一時停止して送信の間隔を空ける）
+                    self.breaker.record_success(key)
+                else:
+                    self.breaker.record_failure(key)
+                if not isinstance(error, TransientError):
+                    raise error
+                if attempt + 1 >= max_attempts:
+                    raise error
+                # 429はサーバーが指定した時間を待ってから再送するので、再試行の予算には数えない
+                if not isinstance(error, RateLimitedError) and not self.budget.try_spend():
+                    raise error
+                delay = self.retry_delay(attempt, error)
+                if on_retry:
+                    on_retry(attempt + 1, error, delay)
+                self.sleep(delay)
+            else:
+                self.breaker.record_success(key)
+                return result
+
+    def wait_for_breaker(self, key, max_attempts):
+        # 遮断中は送信せずに、試しに通せるようになるまで待つ（試しが成功すれば待っていた呼び出しも再開する）。
+        # 試しても失敗し、遮断が reset_timeout の max_attempts 回分続いた場合は諦める
+        deadline = None
+        while not self.breaker.allow(key):
+            if deadline is None:
+                deadline = time.monotonic() + self.breaker.reset_timeout * max_attempts
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise CircuitOpenError(f"{key} への失敗が続いているため、送信を止めています")
+            self.sleep(min(self.breaker.wait_time(key), remaining))
+
+    def retry_delay(self, attempt, error):
+        # サーバーが Retry-After を指定していればそれに従う（上限は max_delay）
+        if error.retry_after is not None:
+            return min(self.max_delay, error.retry_after)
+        return backoff_delay(attempt, self.base_delay, self.max_delay)
@@ -1,69 +1,250 @@
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse, unquote
-from collections import OrderedDict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import mimetypes
+import re
+import threading
+import time
+from page_store import hash_body
+from html_extractor import extract_page
+from discovery import discover_site
+from telemetry import NULL_TELEMETRY
+from resilience import PermanentError, ResilienceError, RetryPolicy, TransientError, classify_status, parse_retry_after
 
-def scrape_clinic_site(url, progress_callback):
+DEFAULT_MAX_WORKERS = 8  # 同時に取得するページ数
+DEFAULT_MAX_PER_HOST = 4  # 1ホストあたりの同時接続数の上限
+DEFAULT_MAX_PAGES = 30  # 最大ページ数（大規模サイトでは引数で増やす）
+
+URL_CACHE_SIZE = 8192
+REQUEST_TIMEOUT = 30  # 応答がないまま待ち続けないように（秒）
+
+# 除外するファイル拡張子
+EXCLUDED_FILE_PATTERN = re.compile(r'\.(pdf|docx?|xlsx?|pptx?|zip|rar)$')
+NEWS_SECTIONS = {'news', 'topics', 'information'}
+
+def scrape_clinic_site(url, progress_callback, **options):
+    return dict(iter_clinic_site(url, progress_callback, **options))
+
+def iter_clinic_site(url, progress_callback, max_workers=DEFAULT_MAX_WORKERS, max_per_host=DEFAULT_MAX_PER_HOST, page_store=None, max_pages=DEFAULT_MAX_PAGES, use_sitemap=True, telemetry=None):
+    # 取得できたページから順に (表示用URL, ページ情報) を返す（順番はBFS順）
     if not url:
-        return {}  # または適切なエラーハンドリング
+        return  # または適切なエラーハンドリング
     
-    base_domain = urlparse(url).netloc
-    visited = OrderedDict()  # 訪問済みURLを順序付きで保存
-    to_visit = [url]
+    session = create_session(max_workers)
+    try:
+        yield from crawl(session, url, progress_callback, max_workers, max_per_host, page_store, max_pages, use_sitemap, telemetry or NULL_TELEMETRY)
+    finally:
+        session.close()
+
+def crawl(session, url, progress_callback, max_workers, max_per_host, page_store, max_pages, use_sitemap, telemetry=NULL_TELEMETRY):
+    base_domain = parse_url(url).netloc
+    to_visit = deque()
+    enqueued = set()  # キューに入れたことのあるURL（normalize_url）
     scraped_data = {}
-    total_pages = 30  # 最大ページ数
-
-    while to_visit and len(scraped_data) < total_pages:
-        current_url = to_visit.pop(0)
-        normalized_url = normalize_url(current_url)
-        
-        if normalized_url in visited or not is_same_domain(current_url, base_domain) or is_blog_page(current_url) or is_excluded_file(current_url) or is_news_subpage(current_url) or is_image_file(current_url):
-            continue
-
-        visited[normalized_url] = True
-
-        try:
-            response = requests.get(current_url)
-            response.raise_for_status()
-            
-            print(f"Processing URL: {current_url}")
-            print(f"Response encoding: {response.encoding}")
-            print(f"Response apparent encoding: {response.apparent_encoding}")
-            
-            # エンコーディングを自動検出
-            if response.encoding and response.encoding.lower() == 'iso-8859-1':
-                response.encoding = response.apparent_encoding
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            display_url = get_display_url(current_url)
-            # トップページのURLを統一
-            if display_url.endswith('/index.html'):
-                display_url = display_url[:-10]  # '/index.html'を削除
-            
-            scraped_data[display_url] = {
-                'title': soup.title.string.strip() if soup.title else '',
-                'description': extract_description(soup),
-                'content': soup.get_text(),
-                'address': extract_address(soup)
-            }
-
-            # 新しいリンクを追加
-            for link in soup.find_all('a', href=True):
-                new_url = urljoin(current_url, link['href'])
-                normalized_new_url = normalize_url(new_url)
-                if normalized_new_url not in visited and is_same_domain(new_url, base_domain) and not is_blog_page(new_url) and not is_excluded_file(new_url) and not is_news_subpage(new_url):
-                    to_visit.append(new_url)
-
-            # 進捗状況をコールバック
-            progress = min(len(scraped_data) / total_pages, 1.0)
-            progress_callback(progress, f"スクレイピング中: {display_url}")
-
-        except requests.RequestException as e:
-            progress_callback(progress, f"エラー: {current_url} のスクレイピングに失敗しました - {str(e)}")
-
-    return scraped_data
+    total_pages = max_pages
+    progress = 0.0
+
+    # robots.txtとsitemap.xmlを確認（サイトマップがなければリンクを辿るだけ）
+    discovery = discover_site(session, url) if use_sitemap else None
+    lastmods = {normalize_url(loc): lastmod for loc, lastmod in discovery.lastmods().items()} if discovery else {}
+    host_limits = HostLimiter(max_per_host, discovery.crawl_delay if discovery else None)
+
+    def enqueue(new_url):
+        # 同じURLは最初の1回だけ判定し、対象ならキューに追加する
+        normalized_new_url = normalize_url(new_url)
+        if normalized_new_url in enqueued:
+            return
+        enqueued.add(normalized_new_url)
+        if is_crawl_target(new_url, base_domain) and (discovery is None or discovery.can_fetch(new_url)):
+            to_visit.append(new_url)
+
+    # トップページの次に、サイトマップのURLを優先度・更新日時の順に並べる
+    enqueue(url)
+    if discovery:
+        for sitemap_url in discovery.urls():
+            enqueue(sitemap_url)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        while to_visit and len(scraped_data) < total_pages:
+            # キューの先頭から残りページ数を超えない範囲でまとめて取り出す（BFS順を維持）
+            batch = []
+            while to_visit and len(batch) < min(max_workers, total_pages - len(scraped_data)):
+                current_url = to_visit.popleft()
+                batch.append((current_url, executor.submit(fetch_page, session, host_limits, current_url, page_store, lastmods.get(normalize_url(current_url)), telemetry)))
+
+            # 取得は並列、結果の反映はキューの順番どおりに行う
+            for current_url, future in batch:
+                try:
+                    response = future.result()
+                    progress, display_url = process_page(current_url, response, enqueue, scraped_data, total_pages, progress_callback, page_store, telemetry)
+                except (requests.RequestException, ResilienceError) as e:
+                    progress_callback(progress, f"エラー: {current_url} のスクレイピングに失敗しました - {str(e)}")
+                    continue
+                yield display_url, scraped_data[display_url]
+
+def create_session(max_workers=DEFAULT_MAX_WORKERS):
+    # Keep-Aliveで接続を使い回すためのセッション
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, max_workers))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class HostLimiter:
+    # ホストごとの同時接続数を制限する（robots.txtのCrawl-delayがあればリクエスト間隔も空ける）
+    def __init__(self, max_per_host, crawl_delay=None):
+        self.max_per_host = max(1, max_per_host)
+        self.crawl_delay = crawl_delay
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_request = {}
+
+    def get(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._semaphores[host]
+
+    def wait(self, host):
+        if not self.crawl_delay:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_request.get(host, now))
+            self._next_request[host] = start + self.crawl_delay
+        time.sleep(start - now)
+
+def fetch_page(session, host_limits, url, page_store=None, lastmod=None, telemetry=NULL_TELEMETRY):
+    # 前回の取得結果があれば条件付きGETで問い合わせる（変更がなければ304が返る）
+    headers = {}
+    record = page_store.get(normalize_url(url)) if page_store else None
+    if record and lastmod and lastmod <= record['fetched_at']:
+        # サイトマップの更新日時が前回の取得より古ければ、リクエスト自体を省略
+        telemetry.record('fetch', url, status='skipped')
+        return None
+    if record:
+        if record['etag']:
+            headers['If-None-Match'] = record['etag']
+        if record['last_modified']:
+            headers['If-Modified-Since'] = record['last_modified']
+    host = urlparse(url).netloc
+
+    def get():
+        queued = time.perf_counter()
+        with host_limits.get(host):
+            host_limits.wait(host)
+            start = time.perf_counter()
+            response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        # 待ち時間（同時接続数の制限・Crawl-delay）と通信時間を分けて記録する
+        telemetry.record(
+            'fetch', url,
+            duration_ms=(time.perf_counter() - start) * 1000,
+            wait_ms=(start - queued) * 1000,
+            bytes=len(response.content),
+            status=response.status_code,
+        )
+        response.raise_for_status()
+        return response
+
+    def on_retry(attempt, error, delay):
+        telemetry.record('fetch_retry', url, retries=1, delay_ms=delay * 1000, error=str(error))
+        print(f"Fetch failed: {url} ({error}). Retrying in {delay:.1f}s... (Attempt {attempt})")
+
+    # 一時的なエラー（5xx、429、タイムアウト等）はホストごとに遮断の判定をしつつ再試行する
+    return fetch_policy.call(get, key=host, on_retry=on_retry)
+
+def classify_request_error(error):
+    response = getattr(error, 'response', None)
+    if isinstance(error, requests.HTTPError) and response is not None:
+        return classify_status(response.status_code, str(error), parse_retry_after(response.headers.get('Retry-After')))
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return TransientError(str(error))
+    return PermanentError(str(error))
+
+fetch_policy = RetryPolicy(classify_request_error)
+
+def process_page(current_url, response, enqueue, scraped_data, total_pages, progress_callback, page_store=None, telemetry=NULL_TELEMETRY):
+    print(f"Processing URL: {current_url}")
+
+    display_url = get_display_url(current_url)
+    # トップページのURLを統一
+    if display_url.endswith('/index.html'):
+        display_url = display_url[:-10]  # '/index.html'を削除
+
+    normalized_url = normalize_url(current_url)
+    record = page_store.get(normalized_url) if page_store else None
+    # response が None の場合はサイトマップの更新日時から変更なしと判断済み
+    not_modified = response is None or response.status_code == 304
+    body_hash = record['body_hash'] if not_modified and record else hash_body(response.content)
+
+    if record and record['body_hash'] == body_hash:
+        # 前回から変更がないページは解析せず、保存済みの内容を使う
+        print(f"Unchanged: {current_url}")
+        page = {
+            'title': record['title'],
+            'description': record['description'],
+            'content': record['content'],
+            'address': record['address'],
+            'body_hash': body_hash
+        }
+        links = record['links']
+    else:
+        print(f"Response encoding: {response.encoding}")
+        print(f"Response apparent encoding: {response.apparent_encoding}")
+
+        # エンコーディングを自動検出
+        if response.encoding and response.encoding.lower() == 'iso-8859-1':
+            response.encoding = response.apparent_encoding
+
+        with telemetry.timer('parse', current_url):
+            extracted = extract_html(response.text)
+        page = {
+            'title': extracted['title'],
+            'description': extracted['description'],
+            'content': extracted['content'],
+            'address': extracted['address'],
+            'body_hash': body_hash
+        }
+        links = [urljoin(current_url, href) for href in extracted['hrefs']]
+
+    # 取得を省略した場合は保存し直さない（fetched_at は実際に取得・確認した時刻のままにする）
+    if page_store and response is not None:
+        etag = response.headers.get('ETag') or (record and record['etag'])
+        last_modified = response.headers.get('Last-Modified') or (record and record['last_modified'])
+        page_store.save(normalized_url, page, links, etag=etag, last_modified=last_modified)
+
+    scraped_data[display_url] = page
+
+    # 新しいリンクを追加
+    for new_url in links:
+        enqueue(new_url)
+
+    # 進捗状況をコールバック
+    progress = min(len(scraped_data) / total_pages, 1.0)
+    progress_callback(progress, f"スクレイピング中: {display_url}")
+    return progress, display_url
+
+def extract_html(html):
+    # 通常は1回の走査で抽出し、失敗した場合のみBeautifulSoupで解析する
+    try:
+        return extract_page(html)
+    except Exception as e:
+        print(f"Streaming extraction failed, falling back to BeautifulSoup: {e}")
+        return extract_html_with_soup(html)
+
+def extract_html_with_soup(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    return {
+        'title': soup.title.string.strip() if soup.title and soup.title.string else '',
+        'description': extract_description(soup),
+        'content': soup.get_text(),
+        'address': extract_address(soup),
+        'hrefs': [link['href'] for link in soup.find_all('a', href=True)]
+    }
 
 def extract_description(soup):
     meta_desc = soup.find('meta', attrs={'name': lambda x: x and x.lower() == 'description'})
@@ -71,6 +252,15 @@ def extract_description(soup):
         return meta_desc['content'].strip()
     return ''
 
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def parse_url(url):
+    # 同じURLを何度もパースしないようにキャッシュする
+    return urlparse(url)
+
+def is_crawl_target(url, base_domain):
+    return bool(is_same_domain(url, base_domain) and not is_blog_page(url) and not is_excluded_file(url) and not is_news_subpage(url))
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
 def normalize_url(url):
     # URLを正規化（日本語URLのデコード、フラグメント除去、末尾のスラッシュ統一）
     parsed = urlparse(unquote(url))
@@ -89,16 +279,15 @@ def get_display_url(url):
     return url
 
 def is_same_domain(url, base_domain):
-    return url and urlparse(url).netloc == base_domain
+    return url and parse_url(url).netloc == base_domain
 
 def is_blog_page(url):
     return url and 'blog' in url.lower()
 
 def is_excluded_file(url):
-    # 除外するファイル拡張子のリスト
-    excluded_extensions = ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.zip', '.rar']
-    return url and (any(url.lower().endswith(ext) for ext in excluded_extensions) or is_image_file(url))
+    return url and (EXCLUDED_FILE_PATTERN.search(url.lower()) is not None or is_image_file(url))
 
+@lru_cache(maxsize=URL_CACHE_SIZE)
 def is_image_file(url):
     # URLの拡張子からMIMEタイプを推測
     mime_type, _ = mimetypes.guess_type(url)
@@ -114,7 +303,7 @@ def extract_address(soup):
 def is_news_subpage(url):
     if not url:
         return False
-    parsed = urlparse(url)
+    parsed = parse_url(url)
     path = parsed.path.strip('/')
     parts = path.split('/')
-    return len(parts) > 1 and parts[0].lower() in ['news', 'topics', 'information'] and len(parts) > 1
\ No newline at end of file
+    return len(parts) > 1 and parts[0].lower() in NEWS_SECTIONS
\ No newline at end of file
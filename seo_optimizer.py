@@ -1,48 +1,175 @@
-from openai import OpenAI
 import os
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from rate_limiter import RateLimiter
+from llm_cache import ResponseCache, make_key
+from compactor import CONTENT_TOKEN_BUDGET, count_tokens, truncate_to_tokens
+from telemetry import NULL_TELEMETRY, estimate_cost
+from resilience import DEFAULT_MAX_ATTEMPTS, PermanentError, RateLimitedError, RetryPolicy, TransientError, classify_status, parse_retry_after
+import json
 import re
 import time
 
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+DEFAULT_MAX_CONCURRENCY = 5  # 同時に送信するAPIリクエスト数の上限
+EXPECTED_COMPLETION_TOKENS = 800  # 1ページあたりの応答で見込む出力トークン数
+DEFAULT_BATCH_SIZE = 5  # 分析のジョブ・batch.py で1リクエストにまとめて生成するページ数
 
-def generate_seo_proposals(processed_data, seo_goal):
-    seo_proposals = {}
-    for page, data in processed_data.items():
-        try:
-            prompt = create_prompt(data, seo_goal)
-            response = call_openai_api_with_retry(prompt)
-            parsed_response = parse_response(response, data)
-            
-            # 回答が不完全な場合、再試行
-            if is_incomplete_response(parsed_response):
-                print(f"Incomplete response for {page}. Retrying...")
-                response = call_openai_api_with_retry(prompt)
-                parsed_response = parse_response(response, data)
-            
-            seo_proposals[page] = parsed_response
-        except Exception as e:
-            print(f"Error processing page {page}: {str(e)}")
-            seo_proposals[page] = {
-                'current_title': data.get('title', ''),
-                'current_description': data.get('description', ''),
-                'clinic_address': data.get('address', ''),
-                'proposed_titles': [],
-                'proposed_descriptions': []
-            }
+# クライアント・レート制限・キャッシュは初めて使うときに作る。
+# openaiのimportは重く、APIキーがなくてもimportできるようにするため（起動時間の短縮、APIを呼ばない処理のみのプロセス）
+
+@lru_cache(maxsize=1)
+def load_env():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+@lru_cache(maxsize=1)
+def get_client():
+    # 1プロセスで1つのクライアント（HTTPのコネクションプール）を全スレッド・全ジョブで共有する
+    from openai import DefaultHttpxClient, OpenAI
+    load_env()
+    # 再試行は llm_policy でまとめて行うので、クライアント側の自動再試行は無効にする
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0, http_client=DefaultHttpxClient())
+
+@lru_cache(maxsize=1)
+def get_rate_limiter():
+    # OpenAIのレート制限（RPM/TPM）。契約プランに合わせて環境変数で変更する
+    load_env()
+    return RateLimiter(
+        requests_per_minute=int(os.getenv("OPENAI_RPM", "500")),
+        tokens_per_minute=int(os.getenv("OPENAI_TPM", "200000")),
+    )
+
+@lru_cache(maxsize=1)
+def get_response_cache():
+    # 同じプロンプトの再実行ではAPIを呼ばずに保存済みの応答を返す
+    return ResponseCache()
+
+def generate_seo_proposals(processed_data, seo_goal, max_concurrency=DEFAULT_MAX_CONCURRENCY, result_callback=None, batch_size=1, telemetry=None):
+    # ページの順番を保つため、先にキーだけ並べておく
+    seo_proposals = dict.fromkeys(processed_data)
+    # batch_size が2以上の場合は、複数ページを1リクエストにまとめて固定の指示文の送信回数を減らす
+    items = list(processed_data.items())
+    groups = [dict(items[i:i + max(1, batch_size)]) for i in range(0, len(items), max(1, batch_size))]
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        futures = [
+            executor.submit(generate_batch_proposals, group, seo_goal, telemetry) if len(group) > 1
+            else executor.submit(generate_single_proposals, group, seo_goal, telemetry)
+            for group in groups
+        ]
+        # 完了したページから順に結果を返す
+        for future in as_completed(futures):
+            for page, proposals in future.result().items():
+                seo_proposals[page] = proposals
+                if result_callback:
+                    result_callback(page, proposals)
     return seo_proposals
 
-def call_openai_api_with_retry(prompt, max_retries=1):
-    for attempt in range(max_retries + 1):
-        try:
-            return call_openai_api(prompt)
-        except Exception as e:
-            if attempt < max_retries:
-                print(f"API call failed. Retrying... (Attempt {attempt + 1}/{max_retries + 1})")
-                time.sleep(2)  # 2秒待機してから再試行
-            else:
-                raise e
+def generate_single_proposals(pages, seo_goal, telemetry=None):
+    return {page: generate_page_proposals(page, data, seo_goal, telemetry) for page, data in pages.items()}
+
+def generate_batch_proposals(pages, seo_goal, telemetry=None):
+    try:
+        messages = build_batch_messages(create_batch_prompt(pages, seo_goal))
+        response = call_chat_with_retry(
+            messages,
+            response_format={"type": "json_object"},
+            completion_tokens=EXPECTED_COMPLETION_TOKENS * len(pages),
+            telemetry=telemetry,
+            label=f"batch:{len(pages)}:{next(iter(pages))}",
+        )
+        results = parse_batch_response(response, pages)
+    except Exception as e:
+        print(f"Error processing batch {list(pages)}: {str(e)}")
+        results = {}
+
+    # まとめての生成で不完全だったページは1ページずつ生成し直す
+    for page, data in pages.items():
+        if page not in results or is_incomplete_response(results[page]):
+            print(f"Incomplete batch response for {page}. Falling back to single-page request...")
+            results[page] = generate_page_proposals(page, data, seo_goal, telemetry)
+    return {page: results[page] for page in pages}
+
+def generate_page_proposals(page, data, seo_goal, telemetry=None):
+    try:
+        prompt = create_prompt(data, seo_goal)
+        response = call_openai_api_with_retry(prompt, telemetry=telemetry, label=page)
+        parsed_response = parse_response(response, data)
+        
+        # 回答が不完全な場合、再試行
+        if is_incomplete_response(parsed_response):
+            print(f"Incomplete response for {page}. Retrying...")
+            response = call_openai_api_with_retry(prompt, use_cache=False, telemetry=telemetry, label=page)
+            parsed_response = parse_response(response, data)
+        
+        return parsed_response
+    except Exception as e:
+        print(f"Error processing page {page}: {str(e)}")
+        return {
+            'current_title': data.get('title', ''),
+            'current_description': data.get('description', ''),
+            'clinic_address': data.get('address', ''),
+            'proposed_titles': [],
+            'proposed_descriptions': []
+        }
+
+def call_openai_api_with_retry(prompt, max_retries=DEFAULT_MAX_ATTEMPTS - 1, use_cache=True, telemetry=None, label=None):
+    return call_chat_with_retry(build_messages(prompt), max_retries=max_retries, use_cache=use_cache, telemetry=telemetry, label=label)
+
+def call_chat_with_retry(messages, max_retries=DEFAULT_MAX_ATTEMPTS - 1, use_cache=True, response_format=None, completion_tokens=EXPECTED_COMPLETION_TOKENS, telemetry=None, label=None):
+    # label は計測ログでどのページ（またはまとめて送信したページ群）の呼び出しかを示す
+    telemetry = telemetry or NULL_TELEMETRY
+    cache_key = make_key(MODEL_NAME, messages)
+    if use_cache:
+        cached = get_response_cache().get(cache_key)
+        if cached is not None:
+            telemetry.record('llm_cache_hit', label)
+            return cached
+        telemetry.record('llm_cache_miss', label)
+
+    estimated_tokens = estimate_tokens(messages, completion_tokens)
+
+    def attempt():
+        start = time.perf_counter()
+        get_rate_limiter().acquire(estimated_tokens)
+        telemetry.record('rate_limit_wait', label, duration_ms=(time.perf_counter() - start) * 1000, estimated_tokens=estimated_tokens)
+        return call_openai_chat(messages, response_format, telemetry, label)
+
+    def on_retry(attempt_number, error, delay):
+        telemetry.record('llm_retry', label, retries=1, delay_ms=delay * 1000, status=error.status, error=str(error))
+        if isinstance(error, RateLimitedError):
+            # 429の場合は他のスレッドも含めて送信を待たせ、同時に再送が集中しないようにする
+            get_rate_limiter().pause(delay)
+        print(f"API call failed. Retrying in {delay:.1f}s... (Attempt {attempt_number}/{max_retries + 1})")
+
+    # 429・5xx・タイムアウトは指数バックオフ（Retry-Afterがあればそれに従う）で再試行し、
+    # 400等のリクエスト内容の誤りは再試行しない
+    response = llm_policy.call(attempt, key="openai", on_retry=on_retry, max_attempts=max_retries + 1)
+    get_response_cache().set(cache_key, response)
+    return response
+
+def classify_openai_error(error):
+    from openai import APIConnectionError, APIStatusError
+    message = f"OpenAI APIの呼び出しに失敗しました: {error}"
+    if isinstance(error, APIStatusError):
+        headers = error.response.headers
+        # OpenAIは秒単位の Retry-After のほかにミリ秒単位の retry-after-ms を返すことがある
+        retry_after = parse_retry_after(headers.get("retry-after"))
+        if headers.get("retry-after-ms"):
+            try:
+                retry_after = float(headers["retry-after-ms"]) / 1000
+            except ValueError:
+                pass
+        return classify_status(error.status_code, message, retry_after)
+    if isinstance(error, APIConnectionError):
+        # APITimeoutError も含む
+        return TransientError(message)
+    return PermanentError(message)
+
+llm_policy = RetryPolicy(classify_openai_error)
+
+def estimate_tokens(messages, completion_tokens=EXPECTED_COMPLETION_TOKENS):
+    # 固定の指示文を含むメッセージ全体と出力分を加えて見積もる
+    return sum(count_tokens(message['content']) for message in messages) + completion_tokens
 
 def is_incomplete_response(parsed_response):
     # 提案されたタイトルまたはディスクリプションが3つ未満の場合、不完全とみなす
@@ -62,10 +189,29 @@ def create_prompt(data, seo_goal):
     SEO目標: {seo_goal}
 
     ページコンテンツ:
-    {data['content'][:2500]}...  # コンテンツの一部のみを使用
+    {truncate_to_tokens(data['content'], CONTENT_TOKEN_BUDGET)}...  # コンテンツの一部のみを使用
 
     """
 
+def create_batch_prompt(pages, seo_goal):
+    # 複数ページ分の情報をページIDつきで並べる
+    sections = []
+    for page_id, data in enumerate(pages.values(), 1):
+        sections.append(f"""
+    ページID: {page_id}
+    現在のタイトル: {data['title']}
+    現在のディスクリプション: {data['description']}
+    クリニック所在地: {extract_city(data['address'])}
+
+    ページコンテンツ:
+    {truncate_to_tokens(data['content'], CONTENT_TOKEN_BUDGET)}...
+    """)
+    return f"""
+    クリニックの複数のウェブページのSEO最適化を行ってください。ページごとに以下の情報を考慮してください：
+
+    SEO目標: {seo_goal}
+    """ + "".join(sections)
+
 def extract_city(address):
     # 住所から市区町村までを抽出する簡易的な関数
     # 注: この正規表現は日本の住所形式を想定しています。必要に応じて調整してください。
@@ -74,13 +220,9 @@ def extract_city(address):
         return match.group(0)
     return address  # マッチしない場合は元の住所を返す
 
-def call_openai_api(prompt):
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",  # または "gpt-4-turbo" など、利用可能なモデルを指定
-            messages=[
-                {"role": "system", "content": 
-    """
+MODEL_NAME = "gpt-4o-mini-2024-07-18"  # または "gpt-4-turbo" など、利用可能なモデルを指定
+
+SYSTEM_PROMPT = """
     あなたはSEO専門家です。クリニックのウェブサイト最適化を支援します。
     
     タスク:
@@ -91,10 +233,8 @@ def call_openai_api(prompt):
     3. 各提案には、クリニックの所在地（市区町村まで）を適切に含めてください。ただし、必要な場合のみ含めてください。
     4. ディスクリプションの文章量は多めに書き、説明文を充実させてください。
     """
-                },
-                {"role": "user", "content": prompt},
-                {"role": "assistant", "content": 
-    """
+
+ASSISTANT_RULES = """
     禁止事項：
     1. 万が一、個人情報が入力された場合はタイトルとディスクリプションには絶対含めないでください。
     
@@ -121,7 +261,9 @@ def call_openai_api(prompt):
     - みえる眼科クリニック。XXXXXX（ページの説明）
     
 
-    回答は以下の形式で提供してください：
+"""
+
+OUTPUT_FORMAT = """    回答は以下の形式で提供してください：
     タイトル案1: [提案]
     タイトル案2: [提案]
     タイトル案3: [提案]
@@ -129,13 +271,62 @@ def call_openai_api(prompt):
     ディスクリプション案2: [提案]
     ディスクリプション案3: [提案]
     """
-            },
-            {"role": "assistant", "content":"ページ名は絶対に改変しないこと。既存サイトからそのまま引用すること。"}
-            ]
+
+ASSISTANT_PROMPT = ASSISTANT_RULES + OUTPUT_FORMAT
+
+BATCH_OUTPUT_FORMAT = """
+    回答は以下のJSON形式で、すべてのページIDについて提供してください：
+    {"pages": [{"id": ページID, "titles": ["タイトル案1", "タイトル案2", "タイトル案3"], "descriptions": ["ディスクリプション案1", "ディスクリプション案2", "ディスクリプション案3"]}]}
+    """
+
+PAGE_NAME_RULE = "ページ名は絶対に改変しないこと。既存サイトからそのまま引用すること。"
+
+def build_messages(prompt):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+        {"role": "assistant", "content": ASSISTANT_PROMPT},
+        {"role": "assistant", "content": PAGE_NAME_RULE}
+    ]
+
+def build_batch_messages(prompt):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+        {"role": "assistant", "content": ASSISTANT_RULES + BATCH_OUTPUT_FORMAT},
+        {"role": "assistant", "content": PAGE_NAME_RULE}
+    ]
+
+def call_openai_api(prompt):
+    return call_openai_chat(build_messages(prompt))
+
+def call_openai_chat(messages, response_format=None, telemetry=None, label=None):
+    telemetry = telemetry or NULL_TELEMETRY
+    options = {"response_format": response_format} if response_format else {}
+    start = time.perf_counter()
+    try:
+        response = get_client().chat.completions.create(
+            model=MODEL_NAME,
+            messages=messages,
+            **options
         )
-        return response.choices[0].message.content
     except Exception as e:
-        raise Exception(f"OpenAI APIの呼び出しに失敗しました: {e}")
+        telemetry.record('llm', label, duration_ms=(time.perf_counter() - start) * 1000, error=str(e))
+        # 429・5xx・400等を呼び出し側で区別できるように分類して投げる
+        raise classify_openai_error(e) from e
+
+    # トークン使用量は料金の見積もりに使う（usage を返さない互換APIもあるので0扱い）
+    usage = response.usage
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    telemetry.record(
+        'llm', label,
+        duration_ms=(time.perf_counter() - start) * 1000,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        cost_usd=estimate_cost(MODEL_NAME, prompt_tokens, completion_tokens),
+    )
+    return response.choices[0].message.content
 
 def parse_response(response, data):
     # APIレスポンスをパースして構造化されたデータに変換
@@ -154,4 +345,32 @@ def parse_response(response, data):
         elif line.startswith("ディスクリプション案"):
             proposals['proposed_descriptions'].append(line.split(": ", 1)[1])
 
-    return proposals
\ No newline at end of file
+    return proposals
+
+def parse_batch_response(response, pages):
+    # JSON形式の応答を、parse_responseと同じ形のページごとの辞書に変換
+    items = json.loads(response).get('pages', [])
+    page_list = list(pages.items())
+    proposals = {}
+    for item in items:
+        try:
+            index = int(item['id']) - 1
+        except (KeyError, ValueError, TypeError):
+            continue
+        if not 0 <= index < len(page_list):
+            continue
+        page, data = page_list[index]
+        proposals[page] = {
+            'current_title': data['title'],
+            'current_description': data['description'],
+            'clinic_address': extract_city(data['address']),
+            'proposed_titles': proposal_list(item.get('titles')),
+            'proposed_descriptions': proposal_list(item.get('descriptions'))
+        }
+    return proposals
+
+def proposal_list(value):
+    # 配列以外（文字列1つ等）は欠落として扱い、1ページずつの生成に回す（文字列を1文字ずつの案にしない）
+    if not isinstance(value, list):
+        return []
+    return [item.strip() for item in value if isinstance(item, str) and item.strip()]
\ No newline at end of file
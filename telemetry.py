@@ -0,0 +1,134 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger("seo_telemetry")
+
+# 100万トークンあたりの料金（USD）。モデルを変更したら追加する
+MODEL_PRICES = {
+    "gpt-4o-mini-2024-07-18": {"input": 0.15, "output": 0.60},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+    "gpt-4o": {"input": 2.50, "output": 10.00},
+}
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    price = MODEL_PRICES.get(model)
+    if not price:
+        return 0.0
+    return (prompt_tokens * price["input"] + completion_tokens * price["output"]) / 1_000_000
+
+def configure_json_logging(path=None):
+    # 計測イベントを1行1JSONで出力する（path を省略すると標準エラー出力）
+    handler = logging.FileHandler(path, encoding="utf-8") if path and path != "-" else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return handler
+
+if os.getenv("SEO_TELEMETRY_LOG"):
+    configure_json_logging(os.getenv("SEO_TELEMETRY_LOG"))
+
+class RunTelemetry:
+    # 1回の分析（1クリニック）分の計測結果を集める
+    def __init__(self, run_id=None):
+        self.run_id = run_id
+        self.events = []
+        self._lock = threading.Lock()
+
+    def record(self, stage, url=None, **fields):
+        event = {"ts": time.time(), "run_id": self.run_id, "stage": stage, "url": url, **fields}
+        with self._lock:
+            self.events.append(event)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(event, ensure_ascii=False))
+        return event
+
+    @contextmanager
+    def timer(self, stage, url=None, **fields):
+        start = time.perf_counter()
+        try:
+            yield fields  # 呼び出し側で fields に値を追加できる
+        finally:
+            self.record(stage, url, duration_ms=(time.perf_counter() - start) * 1000, **fields)
+
+    def summary(self):
+        # ステージごとの件数・所要時間・データ量・トークン数・費用をまとめる
+        with self._lock:
+            events = list(self.events)
+        stages = defaultdict(list)
+        for event in events:
+            stages[event["stage"]].append(event)
+
+        rows = []
+        for stage, items in stages.items():
+            durations = sorted(event["duration_ms"] for event in items if "duration_ms" in event)
+            rows.append({
+                "stage": stage,
+                "count": len(items),
+                "total_ms": round(sum(durations), 1),
+                "avg_ms": round(sum(durations) / len(durations), 1) if durations else 0.0,
+                "p95_ms": round(percentile(durations, 95), 1) if durations else 0.0,
+                "bytes": sum(event.get("bytes", 0) for event in items),
+                "prompt_tokens": sum(event.get("prompt_tokens", 0) for event in items),
+                "completion_tokens": sum(event.get("completion_tokens", 0) for event in items),
+                "retries": sum(event.get("retries", 0) for event in items),
+                "cost_usd": round(sum(event.get("cost_usd", 0.0) for event in items), 6),
+            })
+        return rows
+
+    def totals(self):
+        rows = self.summary()
+        return {
+            "prompt_tokens": sum(row["prompt_tokens"] for row in rows),
+            "completion_tokens": sum(row["completion_tokens"] for row in rows),
+            "cost_usd": round(sum(row["cost_usd"] for row in rows), 6),
+            "bytes": sum(row["bytes"] for row in rows),
+        }
+
+    def to_prometheus(self):
+        # Prometheusのテキスト形式（node_exporterのtextfile collector等で取り込める）
+        rows = self.summary()
+        labels = f'run_id="{escape_label(self.run_id or "")}"'
+        metrics = [
+            ("seo_stage_events_total", "counter", "count", None),
+            ("seo_stage_duration_ms_total", "counter", "total_ms", None),
+            ("seo_stage_duration_ms_p95", "gauge", "p95_ms", None),
+            ("seo_bytes_total", "counter", "bytes", None),
+            ("seo_tokens_total", "counter", "prompt_tokens", "prompt"),
+            ("seo_tokens_total", "counter", "completion_tokens", "completion"),
+            ("seo_retries_total", "counter", "retries", None),
+            ("seo_cost_usd_total", "counter", "cost_usd", None),
+        ]
+        lines = []
+        for name, metric_type, key, kind in metrics:
+            # 同じメトリクスの行はまとめて出力する必要がある
+            if not lines or not lines[-1].startswith(name + "{"):
+                lines.append(f"# TYPE {name} {metric_type}")
+            for row in rows:
+                sample_labels = f'{labels},stage="{escape_label(row["stage"])}"'
+                if kind:
+                    sample_labels += f',kind="{kind}"'
+                lines.append(f"{name}{{{sample_labels}}} {row[key]}")
+        return "\n".join(lines) + "\n"
+
+class NullTelemetry(RunTelemetry):
+    # 計測しない場合の代わり（呼び出し側でNoneチェックをしなくて済むように）
+    def record(self, stage, url=None, **fields):
+        return None
+
+NULL_TELEMETRY = NullTelemetry()
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(len(sorted_values) * p / 100) - 1)
+    return sorted_values[index]
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")